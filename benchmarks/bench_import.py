@@ -0,0 +1,72 @@
+"""
+Import time of the plugin in fresh interpreters.
+
+    python benchmarks/bench_import.py --runs 20
+
+pytest_launchable.plugin is loaded in every pytest run by the pytest11 entry point,
+pytest_launchable.launchable_test_context only with --launchable.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the modules that must not be loaded when --launchable is not given
+HEAVY_MODULES = ["lxml", "yaml", "launchable_cli_args",
+                 "pytest_launchable.launchable_test_context"]
+
+SCRIPT = """
+import sys, time, json
+import pytest
+start = time.perf_counter()
+%s
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+TARGETS = {
+    "plugin": "import pytest_launchable.plugin",
+    "launchable_test_context": "import pytest_launchable.launchable_test_context",
+}
+
+
+def measure(statement: str, runs: int) -> Dict:
+    seconds: List[float] = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        output = subprocess.run((sys.executable, "-c", SCRIPT % (statement, HEAVY_MODULES)), cwd=ROOT_DIR,
+                                stdout=subprocess.PIPE, text=True, check=True).stdout
+        result = json.loads(output)
+        seconds.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"median_seconds": statistics.median(seconds), "min_seconds": min(seconds), "heavy_modules": loaded}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description='benchmark the import time of pytest-launchable')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='number of interpreters started for each module')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = {}
+    for name, statement in TARGETS.items():
+        result = measure(statement, args.runs)
+        heavy_modules = ",".join(result["heavy_modules"]) or "none"
+        print("%-26s %8.2fms (min %.2fms) heavy modules: %s" % (name, result["median_seconds"] * 1000,
+                                                                result["min_seconds"] * 1000, heavy_modules))
+        results[name] = result
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
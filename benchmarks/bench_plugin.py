@@ -0,0 +1,196 @@
+"""
+Benchmarks of the plugin hot paths with synthetic test items and a fake launchable command.
+
+    python benchmarks/bench_plugin.py --sizes 1000,10000 --output bench.json
+
+Each phase is measured for time, and with --memory, for peak traced memory in a second pass.
+Peak memory per phase needs Python 3.9 or later (tracemalloc.reset_peak).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree  # type: ignore # noqa: E402
+from launchable_cli_args import CLIArgs  # noqa: E402
+from pytest_launchable import launchable_test_context as ltc  # noqa: E402
+
+FAKE_LAUNCHABLE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fake_launchable")
+PARAMETERS_PER_FUNCTION = 100
+FUNCTIONS_PER_FILE = 10
+
+
+class FakeItem:
+    """the attributes of pytest.Function used by the plugin"""
+
+    def __init__(self, nodeid: str, keywords: List[str]):
+        self.nodeid = nodeid
+        self.keywords = keywords
+
+
+class FakeReport:
+    """the attributes of pytest.TestReport used by the plugin"""
+
+    def __init__(self, nodeid: str, when: str, outcome: str, longrepr: Optional[str] = None):
+        self.nodeid = nodeid
+        self.when = when
+        self.outcome = outcome
+        self.duration = 0.001
+        self.longrepr = longrepr
+
+
+class FakeConfig:
+    def __init__(self):
+        self.cache = None
+
+    def getini(self, name: str) -> List[str]:
+        return ltc.DEFAULT_PYTHON_FILES if name == "python_files" else []
+
+
+# files of FUNCTIONS_PER_FILE functions with PARAMETERS_PER_FUNCTION parameters each
+def make_items(size: int, with_class: bool) -> List[FakeItem]:
+    items = []
+    for i in range(size):
+        file = "test_mod_%d.py" % (i //
+                                   (PARAMETERS_PER_FUNCTION * FUNCTIONS_PER_FILE))
+        function = "test_func_%d" % (i //
+                                     PARAMETERS_PER_FUNCTION % FUNCTIONS_PER_FILE)
+        name = "%s[%d-value]" % (function, i % PARAMETERS_PER_FUNCTION)
+        # keywords of pytest items contain the names of the parent nodes and markers
+        keywords = [name, function, file, "pytestmark", "parametrize", ""]
+        if with_class:
+            items.append(FakeItem("::".join((file, "TestClass", name)), [
+                         "TestClass"] + keywords))
+        else:
+            items.append(FakeItem("::".join((file, name)), keywords))
+    return items
+
+
+def make_cli(result_dir: str) -> CLIArgs:
+    cli = CLIArgs.auto_configure(".")
+    cli.build_id = "bench"
+    cli.cached_build_id = "bench"  # type: ignore
+    cli.subset.mode = "subset-and-rest"
+    cli.subset.confidence = None
+    cli.subset.target = "50%"
+    cli.record_tests.result_dir = result_dir
+    return cli
+
+
+def log_reports(items: List[FakeItem]) -> None:
+    for i, item in enumerate(items):
+        reports = [FakeReport(item.nodeid, "setup", "passed"),
+                   FakeReport(item.nodeid, "call", "failed", "assert 1 == 2\n" * 10) if i % 10 == 0
+                   else FakeReport(item.nodeid, "call", "passed"),
+                   FakeReport(item.nodeid, "teardown", "passed")]
+        for report in reports:
+            ltc.pytest_runtest_logreport(report)  # type: ignore
+
+
+def write_pretty(path: str) -> None:
+    if ltc.lc is None:
+        return
+    with open(path, "w", encoding="utf-8") as out_strm:
+        out_strm.write(etree.tostring(
+            ltc.lc.junit_xml(), encoding="unicode", pretty_print=True))
+
+
+def write_stream(path: str) -> None:
+    if ltc.lc is not None:
+        ltc.lc.write_junit_xml(path)
+
+
+# run all phases in order, and call measure(phase name, function) for each
+def run_phases(items: List[FakeItem], workdir: str, measure: Callable[[str, Callable[[], object]], None]) -> None:
+    ltc.lc = ltc.LaunchableTestContext()
+    ltc.lc.cli_backend = "process"
+    ltc.cli = make_cli(workdir)
+    config = FakeConfig()
+    measure("init_launchable_test_context",
+            lambda: ltc.init_launchable_test_context(items))  # type: ignore
+    # includes init_launchable_test_context and the subset command
+    measure("pytest_collection_modifyitems",
+            lambda: ltc.pytest_collection_modifyitems(config, list(items)))  # type: ignore
+    measure("pytest_runtest_logreport", lambda: log_reports(items))
+    measure("junit_xml", lambda: ltc.lc.junit_xml()
+            if ltc.lc is not None else None)
+    measure("write_pretty", lambda: write_pretty(
+        os.path.join(workdir, "pretty.xml")))
+    measure("write_stream", lambda: write_stream(
+        os.path.join(workdir, "stream.xml")))
+
+
+def bench(size: int, with_class: bool, memory: bool) -> List[Dict]:
+    items = make_items(size, with_class)
+    results: Dict[str, Dict] = {}
+
+    def measure_time(phase: str, f: Callable[[], object]) -> None:
+        start = time.perf_counter()
+        f()
+        results[phase] = {"size": size, "with_class": with_class, "phase": phase,
+                          "seconds": time.perf_counter() - start}
+
+    def measure_memory(phase: str, f: Callable[[], object]) -> None:
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        f()
+        results[phase]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        # the subset command writes the rest file to the current directory
+        os.chdir(workdir)
+        try:
+            run_phases(items, workdir, measure_time)
+            if memory:
+                tracemalloc.start()
+                try:
+                    run_phases(items, workdir, measure_memory)
+                finally:
+                    tracemalloc.stop()
+        finally:
+            os.chdir(cwd)
+    if size > 0 and "pytest_runtest_logreport" in results:
+        result = results["pytest_runtest_logreport"]
+        result["reports_per_second"] = size * 3 / result["seconds"]
+    return list(results.values())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description='benchmark the hot paths of pytest-launchable')
+    parser.add_argument('--sizes', default="1000,10000,100000,1000000",
+                        help='comma separated numbers of test items')
+    parser.add_argument('--memory', action="store_true",
+                        help='measure peak memory of each phase (slow)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    os.environ["PATH"] = FAKE_LAUNCHABLE_DIR + os.pathsep + os.environ["PATH"]
+    results = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        for with_class in (False, True):
+            for result in bench(size, with_class, args.memory):
+                memory = " %10d bytes" % result["peak_bytes"] if "peak_bytes" in result else ""
+                print("%8d %-10s %-30s %9.3fs%s" % (size, "class" if with_class else "function", result["phase"],
+                                                    result["seconds"], memory))
+                results.append(result)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,13 @@
 import os
 from pathlib import Path
-import subprocess
 from typing import Callable, Optional, Tuple, Union
 
-from yaml2obj.loader import YamlLoaderWithLineNumber
+from launchable_cli_args.memorizer import memorizer
+from yaml2obj.loader import YamlLoaderWithLineNumber, load_file_fast
 from yaml2obj.writer import YamlWriter
 
 from launchable_cli_args.error_counter import ErrorCounter
+from launchable_cli_args.git_commit import resolve_commit_hash
 from launchable_cli_args.recordbuild import RecordBuildArgs
 from launchable_cli_args.recordsession import RecordSessionArgs
 from launchable_cli_args.recordtests import RecordTestsArgs
@@ -14,6 +15,8 @@ from launchable_cli_args.subset import SubsetArgs
 
 
 class CLIArgs:
+    SECTIONS = ("record_build", "record_session", "subset", "record_tests")
+
     def __init__(self):
         self.record_build = RecordBuildArgs(self)
         self.record_session = RecordSessionArgs(self)
@@ -22,8 +25,8 @@ class CLIArgs:
         self.target_dir: str = None
 
     # fill content and print message if necessary
-    # 'data' should have line number information
-    def fill_and_validate(self, data: dict):
+    # 'data' should have line number information for the error messages
+    def fill_and_validate(self, data: dict, print_errors: bool = True):
         self.error_counter = ErrorCounter()
         self.source_object = data
         self.launchable_token = os.getenv("LAUNCHABLE_TOKEN")
@@ -43,9 +46,33 @@ class CLIArgs:
         self.record_tests.fill_and_validate(
             data.get("record-tests", None), self.error_counter)
 
-        if self.error_counter.error_count > 0:
+        if self.error_counter.error_count > 0 and print_errors:
             self.error_counter.print_errors()
 
+    # the validated content that can be restored without parsing and validation.
+    # LAUNCHABLE_TOKEN is not included, it is read again in from_state()
+    def to_state(self) -> dict:
+        state = {"source_object": self.source_object, "build_id": self.build_id,
+                 "errors": self.error_counter.error_messages}
+        for name in self.SECTIONS:
+            state[name] = {k: v for k, v in vars(
+                getattr(self, name)).items() if k != "parent"}
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "CLIArgs":
+        args = CLIArgs()
+        args.error_counter = ErrorCounter()
+        for message in state["errors"]:
+            args.error_counter.record(message)
+        args.source_object = state["source_object"]
+        args.launchable_token = os.getenv("LAUNCHABLE_TOKEN")
+        args.build_id = state["build_id"]
+        args.cached_build_id = None
+        for name in cls.SECTIONS:
+            vars(getattr(args, name)).update(state[name])
+        return args
+
     def write_to(self, writer: YamlWriter):
         writer.comment("Launchable test session configuration file")
         writer.comment(
@@ -82,16 +109,17 @@ class CLIArgs:
     # else, print error message with line number information and return None
     def check_mandatory_field(self, data: dict, key: str, verifier: Callable, error_counter: ErrorCounter) -> Optional[str]:
         value = data.get(key)
-        line_info = data["__line__"]
+        # line numbers are not loaded until an error is found, see load_config_state()
+        line_info = data.get("__line__", {})
         if value is None:
             error_counter.record("object from line %d: key %s is not found" % (
-                line_info["__begin__"], key))
+                line_info.get("__begin__", 0), key))
             return None
         else:
             msg = verifier(value)
             if msg is not None:
                 error_counter.record("line %d: @%s: %s" %
-                                     (line_info[key], key, msg))
+                                     (line_info.get(key, 0), key, msg))
                 return None
             else:
                 return value
@@ -99,7 +127,7 @@ class CLIArgs:
     # parse optional integer field
     def check_int_field(self, data: dict, key: str, default_value: int, error_counter: ErrorCounter):
         value = data.get(key)
-        line_info = data["__line__"]
+        line_info = data.get("__line__", {})
         if value is None:
             # return default value
             return default_value
@@ -108,7 +136,7 @@ class CLIArgs:
                 return int(value)
             except:
                 error_counter.record("line %d attribute %s: %s is not an integer" % (
-                    line_info[key], key, str(value)))
+                    line_info.get(key, 0), key, str(value)))
                 return None
 
     # surrently supported:
@@ -127,10 +155,15 @@ class CLIArgs:
 
     # target_dir is the test files location path, specified at test execution.
     # for example, the unit test command is 'pytest <test_path>', target_dir is <test_path>
+    # the validated configuration is cached by the file status, see load_config_state()
     @classmethod
     def from_yaml(cls, path: str, target_dir=None) -> "CLIArgs":
-        args = CLIArgs()
-        args.fill_and_validate(YamlLoaderWithLineNumber.from_file(path))
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        args = CLIArgs.from_state(load_config_state(path, stat.st_mtime_ns, stat.st_size, os.getcwd(),
+                                                    os.getenv("LAUNCHABLE_TOKEN") is not None))
+        if args.error_counter.error_count > 0:
+            args.error_counter.print_errors()
         args.target_dir = target_dir
         return args
 
@@ -145,14 +178,32 @@ class CLIArgs:
         args.record_tests = RecordTestsArgs.auto_configure(args, path)
         return args
 
+
+# the arguments other than path are the part of the cache key. the result of validation depends on
+# the current directory (record-build source) and on LAUNCHABLE_TOKEN.
+# shared across processes through the cache directory of pytest, or PYTEST_LAUNCHABLE_MEMORIZER_DIR
+@memorizer(persist=True)
+def load_config_state(path: str, mtime_ns: int, size: int, cwd: str, has_token: bool) -> dict:
+    args = CLIArgs()
+    # the libyaml loader without line numbers
+    args.fill_and_validate(load_file_fast(path), print_errors=False)
+    if args.error_counter.error_count > 0:
+        # load again for the line numbers in the error messages
+        args = CLIArgs()
+        args.fill_and_validate(
+            YamlLoaderWithLineNumber.from_file(path), print_errors=False)
+    return args.to_state()
+
+
 # get build id from commit hash
 
 
-def git_rev_parse(dir: str) -> str:
-    h = subprocess.run(("git", "rev-parse", "--short", "HEAD"),
-                       cwd=dir, stdout=subprocess.PIPE, text=True).stdout
+# the same as 'git rev-parse --short HEAD', without running git in most cases. see git_commit.py
+@memorizer
+def git_rev_parse(dir: Optional[str]) -> str:
+    h = resolve_commit_hash(dir or ".")
     print("launchable build id is configured by commit hash: %s" % (h))
-    return h.strip()
+    return h
 
 
 Commands = Tuple[Optional[Union[str, int]], ...]
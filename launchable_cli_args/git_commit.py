@@ -0,0 +1,246 @@
+import os
+import struct
+import subprocess
+from typing import List, Optional, Tuple
+
+from launchable_cli_args.memorizer import memorizer
+
+# same as FALLBACK_DEFAULT_ABBREV of git
+MIN_ABBREV = 7
+
+
+def find_git_dirs(path: str) -> Optional[Tuple[str, str]]:
+    """
+    (git dir, common dir) of the repository containing the path.
+    they are different in a worktree made by 'git worktree add', where HEAD is in the git dir
+    and the refs and the objects are in the common dir
+    """
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+            break
+        if os.path.isfile(dot_git):
+            # "gitdir: <path>" in worktrees and submodules
+            with open(dot_git) as f:
+                line = f.readline().strip()
+            if not line.startswith("gitdir: "):
+                return None
+            git_dir = os.path.join(path, line[len("gitdir: "):])
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file) as f:
+            common_dir = os.path.join(git_dir, f.readline().strip())
+    return os.path.normpath(git_dir), os.path.normpath(common_dir)
+
+
+def is_hash(s: str) -> bool:
+    return len(s) in (40, 64) and all(c in "0123456789abcdef" for c in s)
+
+
+def read_ref(git_dir: str, common_dir: str, ref: str) -> Optional[str]:
+    # a loose ref is a file, symbolic refs are followed like git does
+    for _ in range(5):
+        value = None
+        for d in (git_dir, common_dir):
+            try:
+                with open(os.path.join(d, ref)) as f:
+                    value = f.readline().strip()
+                break
+            except OSError:
+                pass
+        if value is None:
+            return read_packed_ref(common_dir, ref)
+        if not value.startswith("ref: "):
+            return value if is_hash(value) else None
+        ref = value[len("ref: "):]
+    return None
+
+
+def read_packed_ref(common_dir: str, ref: str) -> Optional[str]:
+    try:
+        with open(os.path.join(common_dir, "packed-refs")) as f:
+            for line in f:
+                # "# pack-refs with: ..." header and "^<hash>" of annotated tags are skipped
+                if line.startswith("#") or line.startswith("^"):
+                    continue
+                parts = line.rstrip("\n").split(" ", 1)
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0] if is_hash(parts[0]) else None
+    except OSError:
+        pass
+    return None
+
+
+# full hash of HEAD, or None if it can not be read from the files
+def read_head(path: str) -> Optional[str]:
+    dirs = find_git_dirs(path)
+    if dirs is None:
+        return None
+    git_dir, common_dir = dirs
+    if os.path.isdir(os.path.join(common_dir, "reftable")):
+        return None  # not supported
+    return read_ref(git_dir, common_dir, "HEAD")
+
+
+def read_core_abbrev(common_dir: str) -> Optional[str]:
+    # only "[core]" section and "abbrev = <value>" lines are read, which is enough for core.abbrev
+    value = None
+    try:
+        with open(os.path.join(common_dir, "config")) as f:
+            section = ""
+            for line in f:
+                line = line.split("#", 1)[0].split(";", 1)[0].strip()
+                if line.startswith("["):
+                    section = line.strip("[]").strip().lower()
+                elif section == "core" and "=" in line:
+                    name, v = line.split("=", 1)
+                    if name.strip().lower() == "abbrev":
+                        value = v.strip().strip('"').lower()
+    except OSError:
+        pass
+    return value
+
+
+def pack_index_files(common_dir: str) -> List[str]:
+    pack_dir = os.path.join(common_dir, "objects", "pack")
+    try:
+        return [os.path.join(pack_dir, name) for name in os.listdir(pack_dir) if name.endswith(".idx")]
+    except OSError:
+        return []
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+# the longest common prefix of the hash with the other objects in the pack index (version 2)
+def pack_index_common_prefix(index_file: str, full_hash: str) -> Tuple[int, int]:
+    hash_size = len(full_hash) // 2
+    target = bytes.fromhex(full_hash)
+    with open(index_file, "rb") as f:
+        header = f.read(8)
+        if header != b"\377tOc\0\0\0\2":
+            raise ValueError("unsupported pack index %s" % index_file)
+        fanout = struct.unpack(">256I", f.read(256 * 4))
+        count = fanout[255]
+        first = target[0]
+        lo = fanout[first - 1] if first > 0 else 0
+        hi = fanout[first]
+
+        def read_hash(i: int) -> bytes:
+            f.seek(8 + 256 * 4 + i * hash_size)
+            return f.read(hash_size)
+
+        # the first index of the hash >= target
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if read_hash(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        common = 0
+        for i in (lo - 1, lo, lo + 1):
+            if 0 <= i < count:
+                h = read_hash(i)
+                if h != target:
+                    common = max(common, common_prefix_length(
+                        h.hex(), full_hash))
+    return count, common
+
+
+def loose_objects_common_prefix(common_dir: str, full_hash: str) -> Tuple[int, int]:
+    try:
+        names = os.listdir(os.path.join(
+            common_dir, "objects", full_hash[:2]))
+    except OSError:
+        return 0, 0
+    common = 0
+    for name in names:
+        if full_hash[:2] + name != full_hash:
+            common = max(common, 2 + common_prefix_length(name, full_hash[2:]))
+    return len(names), common
+
+
+def abbreviate(path: str, full_hash: str) -> Optional[str]:
+    """
+    same as 'git rev-parse --short', the length is core.abbrev or estimated from the number of objects,
+    and extended until the abbreviated hash is unique
+    """
+    dirs = find_git_dirs(path)
+    if dirs is None:
+        return None
+    common_dir = dirs[1]
+    abbrev = read_core_abbrev(common_dir)
+    if abbrev in ("no", "false", "off"):
+        return full_hash
+    # the unique length is needed in any case
+    common = loose_objects_common_prefix(common_dir, full_hash)[1]
+    packed_count = 0
+    for index_file in pack_index_files(common_dir):
+        count, c = pack_index_common_prefix(index_file, full_hash)
+        packed_count += count
+        common = max(common, c)
+    if abbrev is not None and abbrev != "auto":
+        length = max(int(abbrev), 4)
+    else:
+        # git estimates the number of objects from the packs
+        length = max((packed_count.bit_length() + 1) // 2, MIN_ABBREV)
+    return full_hash[:max(length, common + 1)]
+
+
+def git_rev_parse_short(path: str) -> str:
+    return subprocess.run(("git", "rev-parse", "--short", "HEAD"),
+                          cwd=path, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+def modification_time(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+# the abbreviated hash changes only when core.abbrev or the objects are changed, which changes one of the
+# modification times (config, packs, loose objects with the same prefix) in the arguments.
+# persisted by the memorizer, so that the pytest sessions of a CI job share the result
+@memorizer(persist=True)
+def abbreviate_persisted(common_dir: str, full_hash: str, config_mtime: int, pack_mtime: int,
+                         loose_mtime: int) -> Optional[str]:
+    return abbreviate(common_dir, full_hash)
+
+
+def resolve_commit_hash(path: str) -> str:
+    """abbreviated hash of HEAD. the git command is used if the repository can not be read directly"""
+    if os.path.isfile(path):
+        path = os.path.dirname(path) or "."
+    dirs = find_git_dirs(path)
+    try:
+        full_hash = read_head(path) if dirs is not None else None
+    except (OSError, ValueError):
+        full_hash = None
+    if dirs is None or full_hash is None:
+        return git_rev_parse_short(path)
+    common_dir = dirs[1]
+    try:
+        short_hash = abbreviate_persisted(common_dir, full_hash,
+                                          modification_time(os.path.join(common_dir, "config")),
+                                          modification_time(os.path.join(common_dir, "objects", "pack")),
+                                          modification_time(os.path.join(common_dir, "objects", full_hash[:2])))
+    except (OSError, ValueError, struct.error):
+        short_hash = None
+    if short_hash is None:
+        short_hash = git_rev_parse_short(path)
+    return short_hash
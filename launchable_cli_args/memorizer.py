@@ -0,0 +1,169 @@
+# cache the result of function call, keyed by the arguments.
+# arguments must be hashable.
+#
+#   @memorizer                      # no limit
+#   @memorizer(maxsize=1000)        # least recently used results are evicted
+#   @memorizer(persist=True)        # results are shared across processes, see persist_path()
+#
+# The new version python seems to have similar features (functools.lru_cache), this also
+# counts hits and misses for the instrumentation of the plugin, and can persist the results.
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# persisted functions must take and return JSON serializable values.
+# the results are persisted in the directory of this environment variable, or in default_persist_dir
+PERSIST_DIR_ENV = "PYTEST_LAUNCHABLE_MEMORIZER_DIR"
+
+# the pytest plugin sets a directory in the cache directory of pytest.
+# nothing is persisted if both are unset
+default_persist_dir: Optional[str] = None
+
+# all memorized functions, for statistics. functions that are not referenced any more are dropped
+registry: "weakref.WeakSet[Memorizer]" = weakref.WeakSet()
+
+_missing = object()
+
+
+class Memorizer:
+    def __init__(self, f: Callable, maxsize: Optional[int] = None, persist: bool = False):
+        self.f = f
+        self.name = "%s.%s" % (f.__module__, f.__qualname__)
+        self.maxsize = maxsize
+        self.persist = persist
+        self.cache: Dict[Any, Any] = OrderedDict() if maxsize else {}
+        self.hits = 0
+        self.misses = 0
+        # for persistence and cache_clear()
+        self.lock = threading.Lock()
+        # results loaded from the persistence file. None until the first miss
+        self.persisted: Optional[Dict[str, Any]] = None
+        # the results of a method are cached in this attribute of the instance
+        self.attribute_name = "_memorizer_" + f.__name__
+        functools.update_wrapper(self, f)
+        registry.add(self)
+
+    def __call__(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        v = self.get(self.cache, key)
+        if v is _missing:
+            v = self.call_persisted(
+                key, args, kwargs) if self.persist else self.f(*args, **kwargs)
+            self.put(self.cache, key, v)
+        return v
+
+    # called as a method. the results are kept by the instance, not by a key including the instance,
+    # so that they are dropped with the instance. they are not persisted
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if not hasattr(instance, "__dict__"):
+            # __slots__. the results are kept by the function with the instance in the key
+            return functools.partial(self, instance)
+        cache = instance.__dict__.get(self.attribute_name)
+        if cache is None:
+            cache = instance.__dict__[self.attribute_name] = OrderedDict() if self.maxsize else {}
+
+        def method(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            v = self.get(cache, key)
+            if v is _missing:
+                v = self.f(instance, *args, **kwargs)
+                self.put(cache, key, v)
+            return v
+        return functools.update_wrapper(method, self.f)
+
+    def get(self, cache: Dict[Any, Any], key: Any) -> Any:
+        v = cache.get(key, _missing)
+        if v is _missing:
+            self.misses += 1
+            return v
+        self.hits += 1
+        if self.maxsize:
+            # single OrderedDict operations are atomic. a key evicted by another thread is not an error
+            try:
+                cache.move_to_end(key)  # type: ignore
+            except KeyError:
+                pass
+        return v
+
+    def put(self, cache: Dict[Any, Any], key: Any, v: Any) -> None:
+        cache[key] = v
+        if self.maxsize and len(cache) > self.maxsize:
+            try:
+                cache.popitem(last=False)  # type: ignore
+            except KeyError:
+                pass
+
+    def cache_clear(self) -> None:
+        # the results of the methods are kept until the instances are dropped
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+            self.persisted = None
+
+    def persist_path(self) -> Optional[str]:
+        directory = os.getenv(PERSIST_DIR_ENV) or default_persist_dir
+        if not directory:
+            return None
+        return os.path.join(directory, self.name + ".json")
+
+    def call_persisted(self, key: Tuple, args: Tuple, kwargs: Dict):
+        path = self.persist_path()
+        if path is None:
+            return self.f(*args, **kwargs)
+        with self.lock:
+            return self.call_persisted_locked(key, args, kwargs, path)
+
+    def call_persisted_locked(self, key: Tuple, args: Tuple, kwargs: Dict, path: str):
+        if self.persisted is None:
+            try:
+                with open(path) as file:
+                    self.persisted = json.load(file)
+            except (OSError, ValueError):
+                self.persisted = {}
+        persisted_key = hashlib.sha256(json.dumps(
+            key, default=str).encode("utf-8")).hexdigest()
+        if persisted_key in self.persisted:  # type: ignore
+            return self.persisted[persisted_key]  # type: ignore
+        v = self.f(*args, **kwargs)
+        self.persisted[persisted_key] = v  # type: ignore
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # other processes may read the file while it is written
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as file:
+                    json.dump(self.persisted, file)
+                os.replace(tmp_path, path)
+            except (TypeError, ValueError):
+                # not JSON serializable
+                del self.persisted[persisted_key]  # type: ignore
+                os.remove(tmp_path)
+        except OSError:
+            pass  # the result is still cached in this process
+        return v
+
+
+def set_default_persist_dir(directory: Optional[str]) -> None:
+    global default_persist_dir
+    default_persist_dir = directory
+
+
+def memorizer(f: Optional[Callable] = None, maxsize: Optional[int] = None, persist: bool = False):
+    if f is not None:
+        return Memorizer(f, maxsize, persist)
+    return lambda f: Memorizer(f, maxsize, persist)
+
+
+# (name, hits, misses, cached entries) of the functions that are called at least once
+def memorizer_stats() -> List[Tuple[str, int, int, int]]:
+    return [(m.name, m.hits, m.misses, len(m.cache)) for m in registry if m.hits + m.misses > 0]
@@ -7,6 +7,17 @@ if TYPE_CHECKING:
 
 
 class RecordTestsArgs:
+    RESULT_FILE_NAME = "test-results.xml"
+    UPLOAD_LOG_FILE_NAME = "launchable-record-tests.log"
+    HISTORY_FILE_NAME = "launchable-history.sqlite3"
+    TIMING_FILE_NAME = "launchable-timing.json"
+    # not *.xml, 'record tests' reads only the xml files in result_dir
+    FAILURE_TEXT_FILE_NAME = "launchable-failures.txt"
+    # subdirectories of result_dir for the early upload. they are not read by 'record tests' of result_dir
+    SUBSET_RESULT_DIR_NAME = "subset"
+    REST_RESULT_DIR_NAME = "rest"
+    CHECKPOINT_DIR_NAME = "checkpoints"
+
     def __init__(self, parent):
         self.parent = parent
 
@@ -15,16 +26,78 @@ class RecordTestsArgs:
             error_counter.record("record-tests section is empty")
         else:
             self.result_dir = data.get("result_dir", None)
+            self.junit_writer: str = data.get("junit_writer", "pretty")
+            if self.junit_writer not in ["pretty", "stream"]:
+                error_counter.record("'junit_writer' must be pretty or stream")
+            self.upload: str = data.get("upload", "sync")
+            if self.upload not in ["sync", "async"]:
+                error_counter.record("'upload' must be sync or async")
+            self.upload_wait = self.parent.check_int_field(
+                data, "upload_wait", 0, error_counter)
+            self.early_upload = data.get("early_upload", False)
+            if not isinstance(self.early_upload, bool):
+                error_counter.record("'early_upload' must be true or false")
+            self.checkpoint_tests = self.parent.check_int_field(
+                data, "checkpoint_tests", 0, error_counter)
+            self.checkpoint_seconds = self.parent.check_int_field(
+                data, "checkpoint_seconds", 0, error_counter)
+            self.history_runs = self.parent.check_int_field(
+                data, "history_runs", 0, error_counter)
+            self.failure_text_limit = self.parent.check_int_field(
+                data, "failure_text_limit", 0, error_counter)
+            self.failure_text_total_limit = self.parent.check_int_field(
+                data, "failure_text_total_limit", 0, error_counter)
 
     def write_to(self, writer: YamlWriter):
         writer.comment("The test results are placed here in JUnit XML format")
         writer.name("result_dir").value(self.result_dir)
+        writer.comment(
+            "junit_writer can be pretty (indented XML) or stream (write test cases one by one to save memory)")
+        writer.name("junit_writer").value(self.junit_writer)
+        writer.comment(
+            "upload can be sync or async (upload in background and let pytest exit while uploading)")
+        writer.name("upload").value(self.upload)
+        writer.comment(
+            "in async mode, seconds to wait for the upload at the end of the test session")
+        writer.name("upload_wait").value(self.upload_wait)
+        writer.comment(
+            "in subset-and-rest mode, upload the results of the subset in background as soon as they are finished")
+        writer.name("early_upload").value(self.early_upload)
+        writer.comment(
+            "write the finished tests to %s/ in result_dir every N tests or every N seconds," % self.CHECKPOINT_DIR_NAME)
+        writer.comment("and drop them from memory. 0 disables each")
+        writer.comment(
+            "the results of a killed session are uploaded by the next session of the same build.")
+        writer.comment("early_upload is not used with checkpoints")
+        writer.name("checkpoint_tests").value(self.checkpoint_tests)
+        writer.name("checkpoint_seconds").value(self.checkpoint_seconds)
+        writer.comment(
+            "keep durations and outcomes of the last N runs of each test locally. 0 disables the history")
+        writer.name("history_runs").value(self.history_runs)
+        writer.comment(
+            "max characters of the failure text of a test, and of all tests. 0 means no limit")
+        writer.comment(
+            "the full text of a truncated failure is written to %s in result_dir" % self.FAILURE_TEXT_FILE_NAME)
+        writer.name("failure_text_limit").value(self.failure_text_limit)
+        writer.name("failure_text_total_limit").value(
+            self.failure_text_total_limit)
 
-    def to_command(self) -> "Commands":
-        return ("launchable", "record", "tests", "--build", self.parent.eval_build_id(), "pytest", self.result_dir)
+    # paths are subdirectories of result_dir to upload a part of the results
+    def to_command(self, *paths: str) -> "Commands":
+        return ("launchable", "record", "tests", "--build", self.parent.eval_build_id(),
+                "pytest") + (paths or (self.result_dir,))
 
     @classmethod
     def auto_configure(cls, parent, path: str) -> "RecordTestsArgs":
         a = RecordTestsArgs(parent)
         a.result_dir = "launchable-test-result"
+        a.junit_writer = "pretty"
+        a.upload = "sync"
+        a.upload_wait = 0
+        a.early_upload = False
+        a.checkpoint_tests = 0
+        a.checkpoint_seconds = 0
+        a.history_runs = 0
+        a.failure_text_limit = 0
+        a.failure_text_total_limit = 0
         return a
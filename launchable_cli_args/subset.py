@@ -27,6 +27,20 @@ class SubsetArgs:
             if reduce(lambda a, e: a if e is None else a+1, [self.target, self.confidence, self.time], 0) != 1:
                 error_counter.record(
                     "one of target/confidence/time must be specified")
+            self.order: str = data.get("order", "service")
+            if self.order not in ["service", "longest-first", "shortest-first"]:
+                error_counter.record(
+                    "'order' must be service, longest-first, or shortest-first")
+            self.granularity: str = data.get("granularity", "case")
+            if self.granularity not in ["file", "class", "case"]:
+                error_counter.record(
+                    "'granularity' must be file, class, or case")
+            self.timeout = self.parent.check_int_field(
+                data, "timeout", 300, error_counter)
+            self.cache_ttl = self.parent.check_int_field(
+                data, "cache_ttl", 0, error_counter)
+            self.cache_size = self.parent.check_int_field(
+                data, "cache_size", 10, error_counter)
 
     def write_to(self, writer: YamlWriter):
         writer.comment("mode can be subset, subset-and-rest, or record-only")
@@ -47,6 +61,23 @@ class SubsetArgs:
         if getattr(self, "time", None) is not None:
             writer.name("time").value(self.time)
 
+        writer.comment(
+            "order of the selected tests: service (as returned), longest-first, or shortest-first.")
+        writer.comment("durations come from the last test results")
+        writer.name("order").value(self.order)
+        writer.comment(
+            "unit of the subset: file, class, or case. all tests of a selected file or class are run")
+        writer.name("granularity").value(self.granularity)
+        writer.comment("seconds to wait for the subset service.")
+        writer.comment(
+            "on timeout or error, the subset is made locally from the last test results")
+        writer.name("timeout").value(self.timeout)
+        writer.comment(
+            "subset responses can be reused for the same build and the same tests for cache_ttl seconds. 0 disables the cache")
+        writer.name("cache_ttl").value(self.cache_ttl)
+        writer.comment("maximum number of cached subset responses")
+        writer.name("cache_size").value(self.cache_size)
+
     def to_command(self) -> "Commands":
         if self.mode == "record-only":
             return ()  # subset command is not applicable
@@ -63,7 +94,9 @@ class SubsetArgs:
             if self.mode == "subset-and-rest":
                 a += ("--rest", SubsetArgs.REST_FILE_NAME)
 
-            a += ("pytest", )
+            # the pytest runner of launchable can not handle file names without test names
+            a += ("file", ) if getattr(self, "granularity",
+                                       "case") == "file" else ("pytest", )
             return a
 
     @classmethod
@@ -71,4 +104,9 @@ class SubsetArgs:
         a = SubsetArgs(parent)
         a.mode = "record-only"
         a.confidence = 99
+        a.order = "service"
+        a.granularity = "case"
+        a.timeout = 300
+        a.cache_ttl = 0
+        a.cache_size = 10
         return a
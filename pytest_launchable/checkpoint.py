@@ -0,0 +1,144 @@
+# rolling JUnit shards of the finished tests, so that the results of a killed session are not lost
+# and the results are not kept in memory until the end of the session.
+#
+#   <result_dir>/checkpoints/<pid>-<time>-<random>/shard-00001.xml
+#                                                 /checkpoint.json   # owner of the directory
+#
+# the shards of a session that did not finish are picked up and uploaded by the next session of the same build.
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Iterator, List, Optional
+
+from lxml import etree  # type: ignore
+
+OWNER_FILE_NAME = "checkpoint.json"
+
+
+def is_process_alive(pid: int) -> bool:
+    if os.name != "posix":
+        # os.kill() terminates the process on Windows. the owner is assumed to be gone
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_owner(run_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(run_dir, OWNER_FILE_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_owner(run_dir: str, owner: dict) -> None:
+    path = os.path.join(run_dir, OWNER_FILE_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(owner, f)
+    os.replace(tmp_path, path)
+
+
+class Checkpoints:
+    """shard files of this session, and the directories of the crashed sessions to upload with them"""
+
+    def __init__(self, directory: str, build_id: str, max_tests: int = 0, max_seconds: float = 0):
+        # 0 disables each limit
+        self.directory = directory
+        self.build_id = build_id
+        self.max_tests = max_tests
+        self.max_seconds = max_seconds
+        self.shard_count = 0
+        self.last_time = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        # found before the directory of this session is made
+        self.orphans = self.find_orphans()
+        self.run_dir = tempfile.mkdtemp(
+            prefix="%d-%d-" % (os.getpid(), int(time.time())), dir=directory)
+        write_owner(self.run_dir, {"pid": os.getpid(), "build_id": build_id})
+
+    def find_orphans(self) -> List[str]:
+        orphans: List[str] = []
+        for name in sorted(os.listdir(self.directory)):
+            run_dir = os.path.join(self.directory, name)
+            if not os.path.isdir(run_dir):
+                continue
+            owner = read_owner(run_dir) or {}
+            upload_pid = owner.get("upload_pid")
+            if upload_pid is not None:
+                # handed over to a background upload of a finished session
+                if not is_process_alive(upload_pid):
+                    shutil.rmtree(run_dir, ignore_errors=True)
+                continue
+            pid = owner.get("pid")
+            if pid is not None and is_process_alive(pid):
+                continue  # another session is running
+            if len(shard_files(run_dir)) == 0:
+                shutil.rmtree(run_dir, ignore_errors=True)
+            elif owner.get("build_id") == self.build_id:
+                orphans.append(run_dir)
+            else:
+                print("launchable checkpoints of another build %s are discarded: %s" % (
+                    owner.get("build_id"), run_dir))
+                shutil.rmtree(run_dir, ignore_errors=True)
+        return orphans
+
+    # checked when a test is finished. there is no timer thread
+    def is_due(self, finished_tests: int) -> bool:
+        if finished_tests == 0:
+            return False
+        if self.max_tests > 0 and finished_tests >= self.max_tests:
+            return True
+        return self.max_seconds > 0 and time.monotonic() - self.last_time >= self.max_seconds
+
+    # write is called with the path of the shard. the shard appears only when it is complete
+    def write_shard(self, write: Callable[[str], None]) -> str:
+        self.shard_count += 1
+        path = os.path.join(self.run_dir, "shard-%05d.xml" % self.shard_count)
+        tmp_path = path + ".tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        self.last_time = time.monotonic()
+        return path
+
+    # <testcase> elements of the shards of this session. each element is valid until the next one is read
+    def iter_elements(self) -> Iterator[etree._Element]:
+        for path in shard_files(self.run_dir):
+            for _, element in etree.iterparse(path, tag="testcase"):
+                yield element
+                element.clear()
+                # drop the elements already read
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    def upload_dirs(self) -> List[str]:
+        return [self.run_dir] + self.orphans
+
+    def remove_uploaded(self) -> None:
+        for run_dir in self.upload_dirs():
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    # the directories are removed by the next session after the upload process exits
+    def hand_over(self, upload_pid: int) -> None:
+        for run_dir in self.upload_dirs():
+            owner = read_owner(run_dir) or {}
+            owner["upload_pid"] = upload_pid
+            try:
+                write_owner(run_dir, owner)
+            except OSError:
+                pass
+
+
+def shard_files(run_dir: str) -> List[str]:
+    try:
+        names = os.listdir(run_dir)
+    except OSError:
+        return []
+    return [os.path.join(run_dir, name) for name in sorted(names) if name.startswith("shard-") and name.endswith(".xml")]
@@ -0,0 +1,84 @@
+# test durations of the previous test session, used to order and balance tests
+import heapq
+import os
+import re
+from statistics import median
+from typing import Dict, List, Set, Tuple
+
+from lxml import etree  # type: ignore
+
+# launchable_test_path attribute written by collect_junit_element()
+LAUNCHABLE_TEST_PATH_RE = re.compile(
+    r"^file=(?P<file>.*?)(?:#class=(?P<class_name>.*?))?#testcase=(?P<testcase>.*)$")
+
+
+def launchable_test_path_to_testpath(launchable_test_path: str) -> str:
+    m = LAUNCHABLE_TEST_PATH_RE.match(launchable_test_path)
+    if m is None:
+        return ""
+    if m.group("class_name") is None:
+        return "::".join((m.group("file"), m.group("testcase")))
+    return "::".join((m.group("file"), m.group("class_name"), m.group("testcase")))
+
+
+# read test-results.xml written by this plugin, and return test path -> setup+call+teardown time,
+# and the set of failed test paths
+def load_junit_results(path: str) -> Tuple[Dict[str, float], Set[str]]:
+    durations: Dict[str, float] = {}
+    failed: Set[str] = set()
+    if not os.path.isfile(path):
+        return durations, failed
+    try:
+        for _, element in etree.iterparse(path, tag="testcase"):
+            testpath = launchable_test_path_to_testpath(
+                element.get("launchable_test_path", ""))
+            if testpath:
+                durations[testpath] = sum(float(element.get(name, 0)) for name in (
+                    "time", "setup_time", "teardown_time"))
+                if element.find("failure") is not None:
+                    failed.add(testpath)
+            element.clear()
+    except (etree.XMLSyntaxError, ValueError):
+        # broken file of a killed session. use what was read
+        pass
+    return durations, failed
+
+
+def load_junit_durations(path: str) -> Dict[str, float]:
+    return load_junit_results(path)[0]
+
+
+# tests without history get the median duration of the others
+def default_duration(durations: Dict[str, float]) -> float:
+    return median(durations.values()) if durations else 1.0
+
+
+def order_testpath_list(testpath_list: List[str], durations: Dict[str, float], strategy: str) -> List[str]:
+    if strategy == "service":
+        return testpath_list
+    default = default_duration(durations)
+    # sorted() is stable, so tests of the same duration keep the order of the service
+    return sorted(testpath_list, key=lambda testpath: durations.get(testpath, default),
+                  reverse=(strategy == "longest-first"))
+
+
+def balance_shards(testpath_list: List[str], durations: Dict[str, float], shard_count: int) -> List[List[str]]:
+    """
+    split the tests into shards of about the same total duration, the longest test first to the shortest shard.
+    the split depends only on the arguments. the CI shards make the same split when they are given the same
+    tests and durations, which are read from the shared subset file.
+    each shard keeps the order of testpath_list
+    """
+    default = default_duration(durations)
+    # (total duration, shard index)
+    totals = [(0.0, index) for index in range(shard_count)]
+    assignment: Dict[str, int] = {}
+    for testpath in sorted(dict.fromkeys(testpath_list), key=lambda testpath: (-durations.get(testpath, default), testpath)):
+        total, index = heapq.heappop(totals)
+        assignment[testpath] = index
+        heapq.heappush(
+            totals, (total + durations.get(testpath, default), index))
+    shards: List[List[str]] = [[] for _ in range(shard_count)]
+    for testpath in testpath_list:
+        shards[assignment[testpath]].append(testpath)
+    return shards
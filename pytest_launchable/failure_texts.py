@@ -0,0 +1,66 @@
+import hashlib
+import os
+from typing import Dict, IO, Optional
+
+
+class FailureTexts:
+    """failure texts of the tests with bounded memory.
+    identical texts are kept once. a text over the limits is truncated,
+    and the full text is written to the spill file"""
+
+    def __init__(self, test_limit: int = 0, total_limit: int = 0, spill_path: Optional[str] = None):
+        # 0 means no limit
+        self.test_limit = test_limit
+        self.total_limit = total_limit
+        self.spill_path = spill_path
+        # hash of the full text -> stored text
+        self.texts: Dict[str, str] = {}
+        # stored text -> hash of the full text
+        self.keys: Dict[str, str] = {}
+        self.total_size = 0
+        self.spill_file: Optional[IO[str]] = None
+
+    def add(self, text: str) -> str:
+        key = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+        stored = self.texts.get(key)
+        if stored is not None:
+            return stored
+        limit = len(text)
+        if self.test_limit > 0:
+            limit = min(limit, self.test_limit)
+        if self.total_limit > 0:
+            limit = min(limit, max(self.total_limit - self.total_size, 0))
+        if limit < len(text):
+            stored = text[:limit] + self.spill(key, text, len(text) - limit)
+        else:
+            stored = text
+        self.texts[key] = stored
+        self.keys[stored] = key
+        self.total_size += limit
+        return stored
+
+    # write the full text and return the note appended to the truncated text
+    def spill(self, key: str, text: str, truncated: int) -> str:
+        if self.spill_path is None:
+            # the hash keeps the texts of different failures with the same beginning apart
+            return "\n... %d characters truncated. the hash of the full text is %s" % (truncated, key)
+        if self.spill_file is None:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            # the file of the previous session is overwritten
+            self.spill_file = open(self.spill_path, "w", encoding="utf-8")
+        self.spill_file.write("=== %s\n%s\n" % (key, text))
+        return "\n... %d characters truncated. the full text is %s in %s" % (
+            truncated, key, os.path.basename(self.spill_path))
+
+    # forget the texts of the tests written to a checkpoint. the total size is kept for the limit.
+    # the texts of the tests not written yet are kept
+    def remove(self, *stored_texts: Optional[str]) -> None:
+        for stored in stored_texts:
+            key = self.keys.pop(stored, None) if stored is not None else None
+            if key is not None:
+                del self.texts[key]
+
+    def close(self) -> None:
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
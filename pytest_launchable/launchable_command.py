@@ -0,0 +1,355 @@
+import contextlib
+import importlib.util
+import io
+import logging
+import subprocess
+import sys
+import threading
+import traceback
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from .timing import PhaseTimer, measure_command
+
+if TYPE_CHECKING:
+    from launchable_cli_args import Commands
+
+# "in-process" calls the entry point of the launchable package in this process,
+# "process" spawns the launchable command
+BACKENDS = ["in-process", "process"]
+
+# sys.stdin and sys.stdout are replaced by ThreadStream while in-process commands read or write them.
+# the lock is held only while the streams are replaced and restored
+std_streams_lock = threading.Lock()
+
+# in-process commands run one at a time, because launchable changes the logging of the process.
+# acquired by the caller of run_in_process(), and released when the command is finished, which may be after a timeout
+in_process_lock = threading.Lock()
+
+
+class ThreadStream:
+    """sys.stdin or sys.stdout while in-process commands run. click reads and writes sys.stdin and sys.stdout,
+    so each command thread is given its own stream here, and the other threads keep using the original stream"""
+
+    def __init__(self, original: Any):
+        self.original = original
+        # thread ident -> stream
+        self.streams: Dict[int, Any] = {}
+
+    def current(self) -> Any:
+        return self.streams.get(threading.get_ident(), self.original)
+
+    def write(self, s):
+        return self.current().write(s)
+
+    def flush(self) -> None:
+        self.current().flush()
+
+    def read(self, *args):
+        return self.current().read(*args)
+
+    def readline(self, *args):
+        return self.current().readline(*args)
+
+    def __iter__(self):
+        return iter(self.current())
+
+    def __getattr__(self, name: str):
+        return getattr(self.current(), name)
+
+
+@contextlib.contextmanager
+def thread_std_streams(stdin: Optional[Any], stdout: Optional[Any]):
+    ident = threading.get_ident()
+    with std_streams_lock:
+        for name, stream in (("stdin", stdin), ("stdout", stdout)):
+            if stream is None:
+                continue
+            proxy = getattr(sys, name)
+            if not isinstance(proxy, ThreadStream):
+                proxy = ThreadStream(proxy)
+                setattr(sys, name, proxy)
+            proxy.streams[ident] = stream
+    try:
+        yield
+    finally:
+        with std_streams_lock:
+            for name in ("stdin", "stdout"):
+                proxy = getattr(sys, name)
+                if isinstance(proxy, ThreadStream):
+                    proxy.streams.pop(ident, None)
+                    if len(proxy.streams) == 0:
+                        setattr(sys, name, proxy.original)
+
+
+# launchable calls logging.basicConfig(), which must not change the logging of pytest
+@contextlib.contextmanager
+def preserved_root_logger():
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    level = root.level
+    try:
+        yield
+    finally:
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+
+def resolve_backend(backend: str) -> str:
+    if backend == "in-process" and importlib.util.find_spec("launchable") is None:
+        return "process"
+    return backend
+
+
+def command_args(command: "Commands") -> List[str]:
+    return [str(a) for a in command]
+
+
+def run_command(command: "Commands", backend: str = "process", input: Optional[str] = None,
+                capture_output: bool = False, timeout: Optional[float] = None,
+                timer: Optional[PhaseTimer] = None) -> subprocess.CompletedProcess:
+    with measure_command(timer, command):
+        # spawned if another in-process command is still running after a timeout
+        if backend == "in-process" and in_process_lock.acquire(blocking=False):
+            return run_in_process(command, input, capture_output, timeout)
+        return subprocess.run(command_args(command), input=input, stdout=subprocess.PIPE if capture_output else None,
+                              text=True, timeout=timeout)
+
+
+# the exit code of the click entry point of launchable, same as `launchable ...`
+def call_main(command: "Commands") -> int:
+    from launchable.__main__ import main  # type: ignore
+    import click
+
+    try:
+        with preserved_root_logger():
+            rv = main.main(args=command_args(command)[1:], prog_name="launchable",
+                           standalone_mode=False)
+        # ctx.exit(n) returns n instead of raising SystemExit without standalone_mode
+        return rv if isinstance(rv, int) else 0
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except click.exceptions.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.exceptions.Abort:
+        return 1
+    except Exception:
+        # same as an uncaught exception of the launchable command
+        traceback.print_exc()
+        return 1
+
+
+# run the command in this process. the caller holds in_process_lock
+# stdin and stdout are used instead of input and the captured output if they are given
+def run_in_process(command: "Commands", input: Optional[str] = None, capture_output: bool = False,
+                   timeout: Optional[float] = None, stdin: Optional[io.TextIOBase] = None,
+                   stdout: Optional[io.TextIOBase] = None) -> subprocess.CompletedProcess:
+    result: subprocess.CompletedProcess = subprocess.CompletedProcess(
+        command_args(command), 1)
+
+    def run():
+        try:
+            if input is None and not capture_output and stdin is None and stdout is None:
+                result.returncode = call_main(command)
+                return
+            output = stdout if stdout is not None else io.StringIO()
+            with thread_std_streams(stdin if stdin is not None else io.StringIO(input or ""),
+                                    output if capture_output or stdout is not None else None):
+                result.returncode = call_main(command)
+            if capture_output and stdout is None:
+                result.stdout = output.getvalue()  # type: ignore
+        finally:
+            in_process_lock.release()
+
+    if timeout is None:
+        run()
+        return result
+    # a running command can not be interrupted, it is left in a daemon thread on timeout
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise subprocess.TimeoutExpired(command_args(command), timeout)
+    return result
+
+
+class LineReader(io.TextIOBase):
+    """stdin of an in-process command, which reads the lines when they are needed"""
+
+    def __init__(self, lines: Iterable[str]):
+        self.lines = iter(lines)
+        self.pending = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return False
+
+    def readline(self, size: Optional[int] = -1) -> str:  # type: ignore
+        if self.pending:
+            line, self.pending = self.pending, ""
+            return line
+        next_line = next(self.lines, None)
+        return "" if next_line is None else next_line + "\n"
+
+    def read(self, size: Optional[int] = -1) -> str:
+        if size is None or size < 0:
+            data = self.pending + "".join(line + "\n" for line in self.lines)
+            self.pending = ""
+            return data
+        data = ""
+        while len(data) < size:
+            line = self.readline()
+            if line == "":
+                break
+            data += line
+        data, self.pending = data[:size], data[size:]
+        return data
+
+
+class LineWriter(io.TextIOBase):
+    """stdout of an in-process command, which keeps the stripped non-empty lines"""
+    encoding = "utf-8"
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.pending = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:  # type: ignore
+        lines = (self.pending + s).split("\n")
+        self.pending = lines.pop()
+        for line in lines:
+            self.add_line(line)
+        return len(s)
+
+    def add_line(self, line: str) -> None:
+        line = line.strip()
+        if line:
+            self.lines.append(line)
+
+    def finish(self) -> List[str]:
+        self.add_line(self.pending)
+        self.pending = ""
+        return self.lines
+
+
+def stream_command(command: "Commands", backend: str, input_lines: Iterable[str], timeout: Optional[float] = None,
+                   timer: Optional[PhaseTimer] = None) -> Tuple[int, List[str]]:
+    """
+    run the command writing input_lines to stdin, while the output is read line by line.
+    no whole input or output text is made. returns the exit code and the stripped non-empty output lines
+    """
+    with measure_command(timer, command):
+        if backend == "in-process" and in_process_lock.acquire(blocking=False):
+            output = LineWriter()
+            result = run_in_process(
+                command, timeout=timeout, stdin=LineReader(input_lines), stdout=output)
+            return result.returncode, output.finish()
+        return stream_process(command, input_lines, timeout)
+
+
+def stream_process(command: "Commands", input_lines: Iterable[str], timeout: Optional[float] = None) -> Tuple[int, List[str]]:
+    process = subprocess.Popen(command_args(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               text=True)
+    # written in another thread, the command may write its output before reading all
+    writer = threading.Thread(target=write_lines, args=(process, input_lines), daemon=True)
+    writer.start()
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer is not None:
+        timer.start()
+    lines: List[str] = []
+    try:
+        for line in process.stdout:  # type: ignore
+            line = line.strip()
+            if line:
+                lines.append(line)
+        returncode = process.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        process.stdout.close()  # type: ignore
+    writer.join()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command_args(command), timeout)  # type: ignore
+    return returncode, lines
+
+
+def write_lines(process: subprocess.Popen, input_lines: Iterable[str]) -> None:
+    try:
+        for chunk in chunked(input_lines, 1000):
+            process.stdin.write("".join(  # type: ignore
+                line + "\n" for line in chunk))
+    except OSError:
+        pass  # the command exits without reading all
+    finally:
+        try:
+            process.stdin.close()  # type: ignore
+        except OSError:
+            pass
+
+
+def chunked(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BackgroundCommands:
+    """run launchable commands one after another in a background thread"""
+
+    def __init__(self, *commands: "Commands", backend: str = "process", timer: Optional[PhaseTimer] = None):
+        self.commands = commands
+        self.backend = backend
+        self.timer = timer
+        self.results: List[subprocess.CompletedProcess] = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        # same as the blocking version, a failure does not stop the following commands
+        for command in self.commands:
+            self.results.append(run_command(
+                command, self.backend, timer=self.timer))
+
+    # return True if all commands are finished
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+
+class DetachedCommand:
+    """run a launchable command in its own process group, so that it can outlive the pytest process"""
+
+    def __init__(self, command: "Commands", log_file: str):
+        self.command = command
+        self.log_file = log_file
+        with open(log_file, "w") as log:
+            # CREATE_NEW_PROCESS_GROUP is defined only on Windows, start_new_session is ignored there
+            self.process = subprocess.Popen(command_args(command), stdin=subprocess.DEVNULL, stdout=log,
+                                            stderr=subprocess.STDOUT, start_new_session=True,
+                                            creationflags=getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0))
+
+    # return the exit code, or None if the command is still running after the timeout
+    def wait(self, timeout: Optional[float]) -> Optional[int]:
+        try:
+            return self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return None
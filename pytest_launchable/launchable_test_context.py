@@ -1,12 +1,27 @@
 from dataclasses import dataclass
+import fnmatch
+import gzip
 import subprocess
 import re
 import os
-from typing import List, Optional, Tuple, Union
+import shutil
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import pytest
-from .memorizer import memorizer
-from launchable_cli_args import CLIArgs
+from launchable_cli_args.memorizer import memorizer, set_default_persist_dir
+from .launchable_command import BackgroundCommands, DetachedCommand, resolve_backend, run_command, stream_command
+from .subset_cache import SubsetCache, SubsetResponse, load_subset_file, save_subset_file
+from . import xdist_support
+from .failure_texts import FailureTexts
+from .checkpoint import Checkpoints
+from .durations import balance_shards, load_junit_results, order_testpath_list
+from .local_subset import local_subset
+from .result_history import ResultHistory
+from .timing import PhaseTimer
+from . import plugin
+from launchable_cli_args import CLIArgs, Commands
 from lxml.builder import E  # type: ignore
 from lxml import etree  # type: ignore
 
@@ -17,6 +32,7 @@ cli: Optional[CLIArgs] = None
 
 @dataclass
 class PytestTestPath:
+    __slots__ = ("file", "class_name", "function", "parameters")
     file: str
     class_name: Optional[str]
     function: str
@@ -30,34 +46,181 @@ class PytestTestPath:
 class LaunchableTestContext:
     def __init__(self):
         self.enabled = True
+        # launchable commands started in pytest_configure
+        self.verify_command: Optional[BackgroundCommands] = None
+        self.session_command: Optional[BackgroundCommands] = None
+        # 'record tests' started in pytest_sessionfinish in async upload mode
+        self.upload_command: Optional[DetachedCommand] = None
+        # 'record tests' of the subset started when the last test of the subset is finished
+        self.early_upload_command: Optional[DetachedCommand] = None
+        # shards of the finished tests, and the history recorded with them. None unless checkpoints are enabled
+        self.checkpoints: Optional[Checkpoints] = None
+        self.history: Optional[ResultHistory] = None
+        # how launchable commands are called. see launchable_command.BACKENDS
+        self.cli_backend = "process"
+        # "controller" or "worker" when running with pytest-xdist
+        self.xdist_role: Optional[str] = None
+        self.xdist_dir: Optional[str] = None
+        self.subset_coordinator: Optional[xdist_support.SubsetCoordinator] = None
+        # time spent in each phase of the plugin. enabled by --launchable-timing
+        self.timer = PhaseTimer()
+        # failure texts of the session, limited by record-tests options
+        self.failure_texts = FailureTexts()
+        # unit of the subset candidates: "file", "class" or "case". see SubsetArgs
+        self.granularity = "case"
+        # this machine runs the shard_index-th of shard_count CI shards of the subset
+        self.shard_index = 0
+        self.shard_count = 1
+        # the subset shared by the CI shards. see --launchable-subset-file
+        self.subset_file: Optional[str] = None
         self.init()
 
     def init(self) -> None:
+        # test_node_list keeps the collection order, the maps below are indexes for lookup
         self.test_node_list: List[LaunchableTestNode] = []
+        self.node_map: Dict[str, LaunchableTestNode] = {}
+        self.testcase_map: Dict[str, LaunchableTestCase] = {}  # nodeid -> testcase
+        # test path returned by 'launchable subset' -> testcase, for the nodeids changed by launchable.
+        # made on the first lookup that needs it
+        self.launchable_testpath_map: Optional[Dict[str, Optional[LaunchableTestCase]]] = None
+        # subset unit -> testcases, made by to_unit_list() unless the granularity is "case"
+        self.unit_map: Dict[str, List[LaunchableTestCase]] = {}
+        # subset request/response. these stay empty in "record-only" mode
+        self.subset_command: Tuple[str, ...] = ()
+        self.subset_input: List[str] = []
+        # the output of the subset command, or its lines
+        self.raw_subset: Union[str, List[str]] = ""
+        self.raw_rest: Optional[List[str]] = None
+        self.subset_list: List[str] = []
+        self.rest_list: Optional[List[str]] = None
+        self.category_map: Optional[Dict[str, str]] = None
+        # "service" or "local" (fallback when the subset service is not available)
+        self.subset_engine = "service"
+        # subset keys (see subset_key()) of the tests of the subset not finished yet.
+        # None unless the early upload is waiting for them
+        self.subset_pending: Optional[Set[str]] = None
+        # tests finished after the last checkpoint
+        self.finished_cases: List[LaunchableTestCase] = []
 
     def get_node_from_path(self, path: str) -> "LaunchableTestNode":
-        for node in self.test_node_list:
-            if node.path == path:
-                return node
-        node = LaunchableTestNode(path)
-        self.test_node_list.append(node)
+        node = self.node_map.get(path)
+        if node is None:
+            node = LaunchableTestNode(self, path)
+            self.node_map[path] = node
+            self.test_node_list.append(node)
         return node
 
-    def find_testcase_from_testpath(self, nodeid: str) -> "LaunchableTestCase":
+    def find_testcase_from_testpath(self, nodeid: str) -> Optional["LaunchableTestCase"]:
+        testcase = self.testcase_map.get(nodeid)
+        if testcase is not None:
+            return testcase
         test_path = parse_nodeid(nodeid)
-        return self.get_node_from_path(test_path.file).find_test_case(test_path.class_name, test_path.fuction_parameters) if test_path.file and test_path.function else None
+        node = self.node_map.get(test_path.file)
+        testcase = node.find_test_case(
+            test_path.class_name, test_path.fuction_parameters) if node is not None and test_path.function else None
+        if testcase is None:
+            testcase = self.find_testcase_from_launchable_testpath(nodeid)
+        return testcase
+
+    # None if the test path is not found, or if it is made from two or more nodeids
+    def find_testcase_from_launchable_testpath(self, testpath: str) -> Optional["LaunchableTestCase"]:
+        if self.launchable_testpath_map is None:
+            self.launchable_testpath_map = {}
+            for nodeid, testcase in self.testcase_map.items():
+                launchable_nodeid = launchable_testpath(nodeid)
+                if launchable_nodeid != nodeid:
+                    duplicated = launchable_nodeid in self.launchable_testpath_map
+                    self.launchable_testpath_map[launchable_nodeid] = None if duplicated else testcase
+        return self.launchable_testpath_map.get(testpath)
+
+    # the session must be recorded before subset and record tests
+    def wait_for_session(self) -> None:
+        if self.session_command is not None:
+            self.session_command.wait()
+
+    def wait_for_commands(self) -> None:
+        self.wait_for_session()
+        if self.verify_command is not None:
+            self.verify_command.wait()
 
     def set_subset_command_request(self, command: Tuple[str], input_files: List[str]) -> None:
         self.subset_command = command
         self.subset_input = input_files
 
-    def set_subset_command_response(self, raw_subset: str, rest_file: Optional[str] = None) -> None:
+    # the rest list is given as the rest file written by the subset command, or as the list itself
+    def set_subset_command_response(self, raw_subset: Union[str, List[str]], rest_file: Optional[str] = None,
+                                    raw_rest: Optional[List[str]] = None) -> None:
         self.raw_subset = raw_subset
         self.raw_rest = read_test_path_list_file(
-            rest_file) if rest_file is not None else None
+            rest_file) if rest_file is not None else raw_rest
         self.subset_list = format_test_path_list(self.raw_subset)
         self.rest_list = format_test_path_list(
-            self.raw_rest) if rest_file is not None and self.raw_rest is not None else None
+            self.raw_rest) if self.raw_rest is not None else None
+        self.category_map = None
+
+    # all tests in the response must be found in the collected tests
+    def is_valid_subset_response(self) -> bool:
+        if self.granularity != "case":
+            for unit in self.subset_list:
+                if unit not in self.unit_map:
+                    return False
+            for unit in self.rest_list or ():
+                if unit not in self.unit_map:
+                    return False
+            return True
+        for testpath in self.subset_list:
+            if self.find_testcase_from_testpath(testpath) is None:
+                return False
+        for testpath in self.rest_list or ():
+            if self.find_testcase_from_testpath(testpath) is None:
+                return False
+        return True
+
+    # replace the units of a valid subset response with the test paths of all their testcases
+    def expand_subset_units(self) -> None:
+        if self.granularity == "case":
+            return
+        self.subset_list = self.expand_units(self.subset_list)
+        if self.rest_list is not None:
+            self.rest_list = self.expand_units(self.rest_list)
+        self.category_map = None
+
+    def expand_units(self, units: List[str]) -> List[str]:
+        r: List[str] = []
+        for unit in units:
+            for testcase in self.unit_map[unit]:
+                r.append(testcase.testpath())
+        return r
+
+    # "subset", "rest" or "unknown"
+    def subset_category(self, nodeid: str) -> str:
+        key = self.subset_key(nodeid)
+        return self.category_map[key] if self.category_map is not None and key is not None else "unknown"
+
+    # the line of the subset response for the nodeid, or None if it is not in the response
+    def subset_key(self, nodeid: str) -> Optional[str]:
+        if self.category_map is None:
+            self.category_map = {}
+            for testpath in self.rest_list or ():
+                self.category_map[testpath] = "rest"
+            for testpath in self.subset_list:
+                self.category_map[testpath] = "subset"
+        if nodeid in self.category_map:
+            return nodeid
+        # xdist controller keeps the lines of the response. the units, or the test paths without inner classes
+        if self.granularity != "case":
+            key = unit_of_testpath(nodeid, self.granularity)
+        else:
+            key = launchable_testpath(nodeid)
+        return key if key in self.category_map else None
+
+    # xdist controller does not collect tests. the test cases are made from the reports of the workers
+    def add_testcase_from_testpath(self, nodeid: str) -> "LaunchableTestCase":
+        test_path = parse_nodeid(nodeid)
+        node = self.get_node_from_path(test_path.file)
+        testcase = node.add_test_case(None, test_path)
+        testcase.launchable_subset_category = self.subset_category(nodeid)
+        return testcase
 
     def to_file_list(self) -> List[str]:
         return list(map(lambda n: n.path, self.test_node_list))
@@ -68,46 +231,138 @@ class LaunchableTestContext:
             node.collect_testpath_list(r)
         return r
 
+    # subset candidates of the granularity, in the collection order
+    def to_unit_list(self) -> List[str]:
+        if self.granularity == "case":
+            return self.to_testpath_list()
+        self.unit_map = {}
+        for node in self.test_node_list:
+            for testcase in node.case_list:
+                unit = testcase.unit(self.granularity)
+                cases = self.unit_map.get(unit)
+                if cases is None:
+                    self.unit_map[unit] = [testcase]
+                else:
+                    cases.append(testcase)
+        return list(self.unit_map)
+
     def to_name_tuple_list(self) -> List[str]:
         r: List[str] = []
         for node in self.test_node_list:
             node.collect_name_tuple_list(r)
         return r
 
+    def junit_testsuite_attributes(self) -> Dict[str, str]:
+        attributes = {'name': "pytest",
+                      'launchable_subset_command': " ".join(self.subset_command),
+                      'launchable_subset_input': ",".join(self.subset_input),
+                      'launchable_raw_subset_response': ",".join(self.raw_subset) if isinstance(self.raw_subset, list)
+                      else self.raw_subset.replace("\r\n", ",")}
+        if self.raw_rest is not None:
+            attributes['launchable_raw_rest_response'] = ",".join(
+                self.raw_rest)
+        if len(self.subset_command) > 0:
+            attributes['launchable_subset_engine'] = self.subset_engine
+            if self.shard_count > 1:
+                attributes['launchable_shard_index'] = str(self.shard_index)
+                attributes['launchable_shard_count'] = str(self.shard_count)
+            if self.granularity != "case":
+                attributes['launchable_subset_granularity'] = self.granularity
+        return attributes
+
     # <class 'lxml.etree._Element'>  is this annotation "Element" correct?
     def junit_xml(self) -> etree._Element:
         array: List = []
         for node in self.test_node_list:
             node.collect_junit_element(array)
-        launchable_extra = {'launchable_subset_command': " ".join(self.subset_command),
-                            'launchable_subset_input': ",".join(self.subset_input),
-                            'launchable_raw_subset_response': self.raw_subset.replace("\r\n", ",")}
-        if self.raw_rest is not None:
-            launchable_extra['launchable_raw_rest_response'] = ",".join(
-                self.raw_rest)
-        return E.testsuites(E.testsuite(*array, name="pytest", **launchable_extra))
+        return E.testsuites(E.testsuite(*array, **self.junit_testsuite_attributes()))
+
+    # (test path, outcome, duration) of the executed tests
+    def iter_history_results(self) -> Iterator[Tuple[str, str, float]]:
+        for node in self.test_node_list:
+            for testcase in node.case_list:
+                result = testcase.history_result()
+                if result is not None:
+                    yield result
+
+    # categories selects the tests by launchable_subset_category, None for all tests
+    def iter_junit_element(self, categories: Optional[Tuple[str, ...]] = None) -> Iterator[etree._Element]:
+        for node in self.test_node_list:
+            for testcase in node.case_list:
+                if categories is not None and testcase.launchable_subset_category not in categories:
+                    continue
+                element = testcase.junit_element()
+                if element is not None:
+                    yield element
+
+    # write the same document as junit_xml() without building the whole tree in memory.
+    # each <testcase> element is serialized as soon as it is made.
+    # the output is identical to the non-pretty form of etree.tostring(self.junit_xml())
+    def write_junit_xml(self, path: str, compress: bool = False, categories: Optional[Tuple[str, ...]] = None) -> None:
+        write_junit_elements(path, self.iter_junit_element(
+            categories), self.junit_testsuite_attributes(), compress)
+
+    # write the results of the tests to a shard, and drop them from memory
+    def write_checkpoint(self, cases: List["LaunchableTestCase"]) -> None:
+        if self.checkpoints is None or len(cases) == 0:
+            return
+        attributes = self.junit_testsuite_attributes()
+        elements = (element for element in (testcase.junit_element()
+                    for testcase in cases) if element is not None)
+        self.checkpoints.write_shard(
+            lambda path: write_junit_elements(path, elements, attributes))
+        if self.history is not None:
+            self.history.record(result for result in (testcase.history_result()
+                                for testcase in cases) if result is not None)
+        for testcase in cases:
+            if testcase.result is not None:
+                self.failure_texts.remove(
+                    testcase.result.failure_message, testcase.result.failure_text)
+            testcase.result = None
+
+
+def write_junit_elements(path: str, elements: Iterator[etree._Element], attributes: Dict[str, str],
+                         compress: bool = False) -> None:
+    first = next(elements, None)
+    with (gzip.open(path, "wb") if compress else open(path, "wb")) as out_strm:
+        with etree.xmlfile(out_strm, encoding="utf-8") as xf:
+            with xf.element("testsuites"):
+                if first is None:
+                    # empty element is written as <testsuite .../> by etree.tostring()
+                    xf.write(E.testsuite(**attributes))
+                else:
+                    with xf.element("testsuite", attributes):
+                        xf.write(first)
+                        for element in elements:
+                            xf.write(element)
 
 # for execution unit ( file )
 
 
 class LaunchableTestNode:
-    def __init__(self, path: str):
+    def __init__(self, context: "LaunchableTestContext", path: str):
+        self.context = context
         self.path = path
         # array of the contents passed in pytest_collection_modifyitems()
         self.case_list: List[LaunchableTestCase] = []
-
-    def add_test_case(self, pytest_item: pytest.Function, test_path: PytestTestPath):
-        self.case_list.append(LaunchableTestCase(
-            self, pytest_item, test_path))
+        # (class name, function name with parameters) -> testcase
+        self.case_map: Dict[Tuple[Optional[str], str],
+                            LaunchableTestCase] = {}
+
+    def add_test_case(self, pytest_item: Optional[pytest.Function], test_path: PytestTestPath) -> "LaunchableTestCase":
+        testcase = LaunchableTestCase(self, pytest_item, test_path)
+        self.case_list.append(testcase)
+        self.case_map[(testcase.class_name,
+                       testcase.function_name_and_parameters)] = testcase
+        self.context.testcase_map[testcase.testpath()] = testcase
+        self.context.launchable_testpath_map = None
+        return testcase
 
     def short_str(self):
         return ",".join(map(lambda c: c.short_str(), self.case_list))
 
     def find_test_case(self, class_name: Optional[str], function_name_and_parameters: str):
-        for testcase in self.case_list:
-            if testcase.class_name == class_name and testcase.function_name_and_parameters == function_name_and_parameters:
-                return testcase
-        return None
+        return self.case_map.get((class_name, function_name_and_parameters))
 
     def collect_testpath_list(self, array: List[str]):
         for testcase in self.case_list:
@@ -120,15 +375,36 @@ class LaunchableTestNode:
     def collect_pytest_items(self, category_name: str, items: List[pytest.Function]):
         for testcase in self.case_list:
             testcase.launchable_subset_category = category_name
-            items.append(testcase.pytest_item)
+            if testcase.pytest_item is not None:
+                items.append(testcase.pytest_item)
 
     def collect_junit_element(self, array):
         for testcase in self.case_list:
             testcase.collect_junit_element(array)
 
 
+class LaunchableTestResult:
+    """the parts of the setup/call/teardown reports used for the results.
+    the reports are not kept because they hold the captured output and the traceback objects"""
+    __slots__ = ("outcome", "setup_duration", "call_duration",
+                 "teardown_duration", "failure_message", "failure_text")
+
+    def __init__(self):
+        # outcome of the call, or of the setup if the test is not called
+        self.outcome = ""
+        self.setup_duration: Optional[float] = None
+        self.call_duration: Optional[float] = None
+        self.teardown_duration: Optional[float] = None
+        # set if the call failed
+        self.failure_message: Optional[str] = None
+        self.failure_text: Optional[str] = None
+
+
 class LaunchableTestCase:
-    def __init__(self, parent_node: "LaunchableTestNode", pytest_item: pytest.Function, test_path: PytestTestPath):
+    __slots__ = ("parent_node", "pytest_item", "test_name_tuple", "class_name", "function_name", "parameters",
+                 "function_name_and_parameters", "launchable_subset_category", "result")
+
+    def __init__(self, parent_node: "LaunchableTestNode", pytest_item: Optional[pytest.Function], test_path: PytestTestPath):
         self.parent_node = parent_node
         self.pytest_item = pytest_item  # in unit test, this may be None
         self.test_name_tuple = test_path
@@ -140,31 +416,65 @@ class LaunchableTestCase:
         self.function_name_and_parameters = test_path.fuction_parameters
         # this is set after calling subset service
         self.launchable_subset_category = "unknown"
+        self.result: Optional[LaunchableTestResult] = None
 
-    def collect_testpath_list(self, array: List[str]):
+    def testpath(self) -> str:
         if self.class_name is None:
-            array.append(
-                "::".join((self.parent_node.path, self.function_name_and_parameters)))
+            return "::".join((self.parent_node.path, self.function_name_and_parameters))
         else:
-            array.append("::".join(
-                (self.parent_node.path, self.class_name, self.function_name_and_parameters)))
+            return "::".join((self.parent_node.path, self.class_name, self.function_name_and_parameters))
+
+    def collect_testpath_list(self, array: List[str]):
+        array.append(self.testpath())
+
+    def unit(self, granularity: str) -> str:
+        if granularity == "case":
+            return self.testpath()
+        return make_unit(self.parent_node.path, self.class_name, self.function_name, granularity)
 
     def short_str(self) -> str:
         return "file=%s class=%s testcase=%s params=%s" % (self.parent_node.path, self.class_name, self.function_name, self.parameters)
 
     def set_result(self, pytest_result: "pytest.TestReport"):
+        result = self.result
+        if result is None:
+            result = self.result = LaunchableTestResult()
         if pytest_result.when == "setup":
-            self.setup_result = pytest_result
+            result.setup_duration = pytest_result.duration
+            if result.call_duration is None:
+                result.outcome = pytest_result.outcome
         elif pytest_result.when == "teardown":
-            self.teardown_result = pytest_result
+            result.teardown_duration = pytest_result.duration
         elif pytest_result.when == "call":
-            self.call_result = pytest_result
+            result.call_duration = pytest_result.duration
+            result.outcome = pytest_result.outcome
+            if pytest_result.outcome == 'failed':
+                # copied from junit formatter of pytest
+                longrepr = pytest_result.longrepr
+                failure_texts = self.parent_node.context.failure_texts
+                result.failure_message = failure_texts.add(longrepr.reprcrash.message) if hasattr(  # type: ignore
+                    longrepr, "reprcrash") else ""
+                result.failure_text = failure_texts.add(str(longrepr))
         else:
             raise Exception("unexpected 'when' %s" % pytest_result.when)
 
+    def history_result(self) -> Optional[Tuple[str, str, float]]:
+        result = self.result
+        if result is None or result.setup_duration is None:
+            return None
+        duration = sum(d for d in (result.setup_duration, result.call_duration,
+                       result.teardown_duration) if d is not None)
+        return self.testpath(), result.outcome, duration
+
     def collect_junit_element(self, array: List) -> None:
-        if not hasattr(self, "call_result"):
-            return
+        element = self.junit_element()
+        if element is not None:
+            array.append(element)
+
+    def junit_element(self) -> Optional[etree._Element]:
+        result = self.result
+        if result is None or result.call_duration is None:
+            return None
         output_classname = self.parent_node.path.replace(".py", "").replace(
             "/", ".")  # ugly, but actual junit result is this pattern
         output_function_name = self.function_name
@@ -176,43 +486,82 @@ class LaunchableTestCase:
             launchable_test_path = "file=%s#testcase=%s" % (
                 self.parent_node.path, output_function_name)
         else:
-            output_classname += "." + self.class_name
+            # nested classes are joined with "." as pytest's junitxml does
+            output_classname += "." + self.class_name.replace("::", ".")
             launchable_test_path = "file=%s#class=%s#testcase=%s" % (
                 self.parent_node.path, self.class_name, output_function_name)
 
         content: Union[etree._Element, str] = ""
-        message: str = ""
-        if self.call_result.outcome == 'failed':
-            message = ""
-            # copied from junit formatter of pytest
-            longrepr = self.call_result.longrepr
-            if hasattr(longrepr, "reprcrash"):
-                message = longrepr.reprcrash.message  # type: ignore
+        if result.failure_text is not None:
             content = E.failure(
-                str(longrepr), message=message)
-        array.append(E.testcase(content,
-                                classname=output_classname,
-                                name=output_function_name,
-                                time=str(self.call_result.duration),
-                                setup_time=str(self.setup_result.duration),
-                                teardown_time=str(
-                                    self.teardown_result.duration),
-                                launchable_test_path=launchable_test_path,
-                                launchable_subset_category=self.launchable_subset_category))
-
-
-def is_pytest_test_file(path: str) -> bool:
-    """check the path is pytest test file or not"""
-    @memorizer
-    def pytest_test_file_re():
-        return re.compile(".*test_.*\.py$")
-    return pytest_test_file_re().search(path)
+                result.failure_text, message=result.failure_message)
+        return E.testcase(content,
+                          classname=output_classname,
+                          name=output_function_name,
+                          time=str(result.call_duration),
+                          setup_time=str(result.setup_duration),
+                          teardown_time=str(
+                              result.teardown_duration or 0.0),
+                          launchable_test_path=launchable_test_path,
+                          launchable_subset_category=self.launchable_subset_category)
+
+
+# same as the default of pytest's python_files ini option
+DEFAULT_PYTHON_FILES = ["test_*.py", "*_test.py"]
+
+
+@memorizer
+def compile_glob(glob: str) -> "re.Pattern":
+    # same as fnmatch.fnmatch(). the compiled globs are counted in the memorizer stats
+    return re.compile(fnmatch.translate(os.path.normcase(glob)))
+
+
+def match_python_files(path: str, python_files: List[str]) -> bool:
+    """check the path matches one of the python_files globs.
+    a glob without "/" is matched to the file name, as pytest does"""
+    name = os.path.basename(path)
+    for glob in python_files:
+        if compile_glob(glob).match(os.path.normcase(path if "/" in glob or os.sep in glob else name)):
+            return True
+    return False
+
+
+# "file", "file::class" or "file::function" for the module level functions
+def make_unit(file: str, class_name: Optional[str], function: str, granularity: str) -> str:
+    if granularity == "file":
+        return file
+    return "::".join((file, class_name or function))
+
+
+def unit_of_testpath(testpath: str, granularity: str) -> str:
+    if granularity == "case":
+        return testpath
+    test_path = parse_nodeid(testpath)
+    return make_unit(test_path.file, test_path.class_name, test_path.function, granularity)
+
+
+# durations and fail rates of the units. a unit takes the total duration and the highest fail rate of its tests
+def unit_history(durations: Dict[str, float], fail_rates: Dict[str, float],
+                 granularity: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+    if granularity == "case":
+        return durations, fail_rates
+    unit_durations: Dict[str, float] = {}
+    for testpath, duration in durations.items():
+        unit = unit_of_testpath(testpath, granularity)
+        unit_durations[unit] = unit_durations.get(unit, 0.0) + duration
+    unit_fail_rates: Dict[str, float] = {}
+    for testpath, fail_rate in fail_rates.items():
+        unit = unit_of_testpath(testpath, granularity)
+        unit_fail_rates[unit] = max(unit_fail_rates.get(unit, 0.0), fail_rate)
+    return unit_durations, unit_fail_rates
 
 
 def read_test_path_list_file(filename: str) -> List[str]:
+    # read line by line, the rest file can be as large as the candidates.
+    # it is not streamed like the subset, because the subset command writes it when it exits.
+    # the lines are kept for the subset cache and the launchable_raw_rest_response attribute
     with open(filename) as file:
-        lines = file.readlines()
-        return [line.rstrip() for line in lines]
+        return [line.rstrip() for line in file]
 
 
 def format_test_path_list(input: Union[List, str]) -> List[str]:
@@ -222,49 +571,263 @@ def format_test_path_list(input: Union[List, str]) -> List[str]:
     return list(filter(lambda e: len(e) > 0, [e.strip() for e in input]))
 
 
-def pytest_addoption(parser):
-    # sample for introducing custom command line option
-    group = parser.getgroup("launchable arguments")
-    group.addoption('--launchable', '--launchable',
-                    action="store_true",
-                    dest="launchable",
-                    help="enable launchable feature")
-    group.addoption('--launchable-conf-path', '--launchable-conf-path',
-                    action="store",
-                    dest="launchable_conf_path",
-                    metavar="",
-                    default=".launchable.d/config.yml",
-                    help="path of launchable test configuration file")
+# the command line options are added by plugin.py
 
 
 def pytest_configure(config) -> None:
     global cli, lc
-    test_target = config.option.file_or_dir[0]
+    test_target = config.option.file_or_dir[0] if config.option.file_or_dir else os.getcwd()
     lc = LaunchableTestContext()
-    lc.enabled = True if (hasattr(config, "option")
-                          and config.option.launchable) else False
+    lc.enabled = plugin.is_enabled(config)
 
     if lc.enabled:
+        lc.timer.enabled = bool(getattr(config.option, "launchable_timing", False) or getattr(
+            config.option, "launchable_timing_json", False))
         conf_file_path = config.option.launchable_conf_path
-        cli = CLIArgs.from_yaml(conf_file_path, target_dir=test_target)
-        subprocess.run(("launchable", "verify"))
-        subprocess.run(cli.record_build.to_command())
-        subprocess.run(cli.record_session.to_command())
+        # the validated configuration is shared with the next sessions and the xdist workers
+        try:
+            set_default_persist_dir(launchable_cache_dir(config, "memorizer"))
+        except OSError:
+            pass
+        with lc.timer.measure("config"):
+            cli = CLIArgs.from_yaml(conf_file_path, target_dir=test_target)
+        # falls back to "process" if the launchable package is not importable
+        lc.cli_backend = resolve_backend(config.option.launchable_cli_backend)
+        lc.granularity = getattr(cli.subset, "granularity", "case")
+        configure_shards(config)
+        if xdist_support.is_xdist_worker(config):
+            # everything is done by the controller, except the subset of the remote workers
+            lc.xdist_role = "worker"
+            lc.xdist_dir = xdist_support.xdist_shared_dir(config)
+            return
+        if xdist_support.is_xdist_controller(config):
+            configure_xdist_controller(config)
+        lc.failure_texts = FailureTexts(getattr(cli.record_tests, "failure_text_limit", 0) or 0,
+                                        getattr(cli.record_tests, "failure_text_total_limit", 0) or 0,
+                                        os.path.join(cli.record_tests.result_dir, cli.record_tests.FAILURE_TEXT_FILE_NAME))
+        # resolve the build id before the commands are made in different threads
+        with lc.timer.measure("build id"):
+            cli.eval_build_id()
+        if is_checkpoint_enabled(cli):
+            lc.checkpoints = Checkpoints(os.path.join(cli.record_tests.result_dir, cli.record_tests.CHECKPOINT_DIR_NAME),
+                                         cli.eval_build_id(), getattr(cli.record_tests, "checkpoint_tests", 0) or 0,
+                                         getattr(cli.record_tests, "checkpoint_seconds", 0) or 0)
+            lc.history = open_result_history(config, cli)
+        # 'verify' is independent of the others, 'record session' needs the recorded build.
+        # these run while pytest collects the tests
+        # spawned with both backends. in-process commands in the background would write to
+        # the streams and the logging of pytest while the tests are collected
+        lc.verify_command = BackgroundCommands(
+            ("launchable", "verify"), backend="process", timer=lc.timer)
+        lc.session_command = BackgroundCommands(
+            cli.record_build.to_command(), cli.record_session.to_command(), backend="process", timer=lc.timer)
+
+
+def configure_shards(config) -> None:
+    if lc is None:
+        raise Exception("launchable test context is not initialized")
+    lc.shard_index = getattr(config.option, "launchable_shard_index", 0)
+    lc.shard_count = getattr(config.option, "launchable_shard_count", 1)
+    if lc.shard_count < 1:
+        raise pytest.UsageError(
+            "--launchable-shard-count must be 1 or more")
+    if not 0 <= lc.shard_index < lc.shard_count:
+        raise pytest.UsageError(
+            "--launchable-shard-index must be 0 to %d" % (lc.shard_count - 1))
+    lc.subset_file = getattr(config.option, "launchable_subset_file", None)
+    if lc.shard_count > 1 and lc.subset_file is None:
+        # each shard would make its own subset and its own split with the durations of its last shard
+        raise pytest.UsageError(
+            "--launchable-shard-count needs --launchable-subset-file, so that all shards run the same subset")
+
+
+def configure_xdist_controller(config) -> None:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    lc.xdist_role = "controller"
+    if xdist_support.has_remote_workers(config):
+        if len(cli.subset.to_command()) > 0:
+            print("launchable subset is requested by each worker, because some workers are remote")
+        return
+    lc.xdist_dir = tempfile.mkdtemp(prefix="launchable-xdist-")
+    if len(cli.subset.to_command()) > 0:
+        lc.subset_coordinator = xdist_support.SubsetCoordinator(
+            lc.xdist_dir, lambda testpath_list: controller_request_subset(config, testpath_list))
 
 
-def init_launchable_test_context(items: List[pytest.Function]) -> "LaunchableTestContext":
-    if lc is None:
+# called on xdist controller for each worker
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node) -> None:
+    if lc is not None and lc.xdist_dir is not None:
+        node.workerinput[xdist_support.WORKERINPUT_KEY] = lc.xdist_dir
+
+
+def controller_request_subset(config, testpath_list: List[str]) -> SubsetResponse:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    subset_command = cli.subset.to_command()
+    lc.wait_for_session()
+    lc.set_subset_command_request(subset_command, testpath_list)
+    with lc.timer.measure("subset request"):
+        raw_subset, raw_rest = request_subset(
+            config, subset_command, testpath_list)
+    lc.set_subset_command_response(raw_subset, raw_rest=raw_rest)
+    # units of the other granularities can not be counted without the collected tests
+    # the CI shard of this machine is not known either
+    # the early upload starts when every line of the subset is reported by the workers
+    if is_early_upload_enabled(cli) and lc.granularity == "case" and lc.shard_count == 1 and len(lc.subset_list) > 0 \
+            and lc.rest_list:
+        lc.subset_pending = set(lc.subset_list)
+    return raw_subset, raw_rest
+
+
+# read the subset file, or call subset command and write the subset file
+def request_subset(config, subset_command: Tuple[str, ...], testpath_list: List[str]) -> SubsetResponse:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    if lc.subset_file is not None and os.path.isfile(lc.subset_file):
+        response, lc.subset_engine, _ = load_subset_file(lc.subset_file)
+        return response
+    response = call_subset(config, subset_command, testpath_list)
+    if lc.subset_file is not None:
+        durations = unit_history(load_test_durations(
+            config, cli), {}, lc.granularity)[0]
+        save_subset_file(lc.subset_file, response, lc.subset_engine, {
+            testpath: durations[testpath] for testpath in testpath_list if testpath in durations})
+    return response
+
+
+# durations used to split the subset into the CI shards. the ones in the subset file are the same on all shards
+def load_shard_durations() -> Dict[str, float]:
+    if lc is None or lc.subset_file is None:
+        raise Exception("subset file is not given")
+    return load_subset_file(lc.subset_file)[2]
+
+
+# call subset command, or reuse the cached response
+def call_subset(config, subset_command: Tuple[str, ...], testpath_list: List[str]) -> SubsetResponse:
+    if lc is None or cli is None:
         raise Exception("launchable test context is not initialized")
 
+    subset_cache = make_subset_cache(config, cli)
+    cache_key = SubsetCache.make_key(
+        cli.eval_build_id(), cli.subset, testpath_list) if subset_cache is not None else ""
+    cached_response = subset_cache.get(
+        cache_key) if subset_cache is not None else None
+    if cached_response is not None:
+        lc.subset_engine = "service"
+        return cached_response
+
+    try:
+        # the candidates are written and the output is read at the same time
+        returncode, raw_subset = stream_command(subset_command, lc.cli_backend, testpath_list,
+                                                timeout=cli.subset.timeout or None, timer=lc.timer)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print("launchable subset failed (%s). the subset is made locally" % e)
+        return local_subset_response(config, testpath_list)
+    if returncode != 0 or (len(testpath_list) > 0 and len(raw_subset) == 0):
+        print("launchable subset failed (exit code %d, %d lines of output). the subset is made locally" % (
+            returncode, len(raw_subset)))
+        return local_subset_response(config, testpath_list)
+    try:
+        raw_rest = read_test_path_list_file(
+            cli.subset.REST_FILE_NAME) if cli.subset.mode == "subset-and-rest" else None
+    except OSError as e:
+        print("launchable subset failed (%s). the subset is made locally" % e)
+        return local_subset_response(config, testpath_list)
+    lc.subset_engine = "service"
+    if subset_cache is not None:
+        subset_cache.put(cache_key, raw_subset, raw_rest)
+    return raw_subset, raw_rest
+
+
+# directory for the plugin in pytest's cache directory. None if the cacheprovider plugin is disabled
+def launchable_cache_dir(config, name: str) -> Optional[str]:
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        return None
+    # Cache.makedir() is renamed to Cache.mkdir() in pytest 6.3
+    mkdir = getattr(cache, "mkdir", None) or cache.makedir
+    return str(mkdir("launchable_" + name))
+
+
+def open_result_history(config, cli: CLIArgs) -> Optional[ResultHistory]:
+    history_runs = getattr(cli.record_tests, "history_runs", None)
+    if history_runs is None or history_runs <= 0:
+        return None
+    directory = launchable_cache_dir(config, "history")
+    if directory is None:
+        directory = cli.record_tests.result_dir
+        os.makedirs(directory, exist_ok=True)
+    return ResultHistory(os.path.join(directory, cli.record_tests.HISTORY_FILE_NAME), history_runs)
+
+
+# test path -> duration. the local history is used if it is enabled, else the last result file
+def load_test_durations(config, cli: CLIArgs) -> Dict[str, float]:
+    return load_test_history(config, cli)[0]
+
+
+# test path -> duration, and test path -> fail rate
+def load_test_history(config, cli: CLIArgs) -> Tuple[Dict[str, float], Dict[str, float]]:
+    history = open_result_history(config, cli)
+    if history is not None:
+        try:
+            stats = history.stats()
+        finally:
+            history.close()
+        if len(stats) > 0:
+            return ({testpath: s.p50 for testpath, s in stats.items()},
+                    {testpath: s.fail_rate for testpath, s in stats.items()})
+    durations, failed = load_junit_results(os.path.join(
+        cli.record_tests.result_dir, cli.record_tests.RESULT_FILE_NAME))
+    return durations, dict.fromkeys(failed, 1.0)
+
+
+# used when the subset service fails, times out, or returns an unusable response
+def local_subset_response(config, testpath_list: List[str]) -> SubsetResponse:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    durations, fail_rates = unit_history(
+        *load_test_history(config, cli), lc.granularity)
+    subset_list, rest_list = local_subset(
+        testpath_list, cli.subset, durations, fail_rates)
+    lc.subset_engine = "local"
+    raw_rest = rest_list if cli.subset.mode == "subset-and-rest" else None
+    return subset_list, raw_rest
+
+
+def make_subset_cache(config, cli: CLIArgs) -> Optional[SubsetCache]:
+    cache_ttl = getattr(cli.subset, "cache_ttl", None)
+    if cache_ttl is None or cache_ttl <= 0:
+        return None
+    directory = launchable_cache_dir(config, "subset")
+    if directory is None:
+        return None
+    return SubsetCache(directory, cache_ttl, cli.subset.cache_size)
+
+
+# python_files is the ini option of pytest. the tests in other files are not recorded
+def init_launchable_test_context(items: List[pytest.Function],
+                                 python_files: Optional[List[str]] = None) -> "LaunchableTestContext":
+    global lc
+    if lc is None:
+        # called without pytest_configure, in unit tests
+        lc = LaunchableTestContext()
+
+    if python_files is None:
+        python_files = DEFAULT_PYTHON_FILES
     lc.init()
+    # file path in the nodeid -> node, or None if the file does not match python_files
+    file_nodes: Dict[str, Optional[LaunchableTestNode]] = {}
     for testcase in items:
-        lc_node: Optional[LaunchableTestNode] = None
-        # keywords is defined in pytest class NodeKeywords
-        for k in testcase.keywords:
-            # we got parameters as fllowing key: pytestmark [Mark(name='parametrize', args=('x', [1.0, 0.0]), kwargs={})]
-            if is_pytest_test_file(k):
-                lc_node = lc.get_node_from_path(k)
+        # the file is taken from the nodeid, which is also the key of the test reports
         test_names = parse_pytest_item(testcase)
+        if test_names.file in file_nodes:
+            lc_node = file_nodes[test_names.file]
+        else:
+            lc_node = lc.get_node_from_path(test_names.file) if match_python_files(
+                test_names.file, python_files) else None
+            file_nodes[test_names.file] = lc_node
         if lc_node is not None:
             lc_node.add_test_case(testcase, test_names)
     return lc
@@ -277,6 +840,8 @@ def init_launchable_test_context(items: List[pytest.Function]) -> "LaunchableTes
 # we get a chance of reordering or subsetting at this point
 
 
+# after the other plugins and conftest.py, which may deselect or reorder the items
+@pytest.hookimpl(trylast=True)
 def pytest_collection_modifyitems(config, items: List[pytest.Function]) -> None:
     if lc is None:
         raise Exception("launchable test context is not initialized")
@@ -284,34 +849,37 @@ def pytest_collection_modifyitems(config, items: List[pytest.Function]) -> None:
     if not lc.enabled:
         return
 
-    init_launchable_test_context(items)
+    with lc.timer.measure("test context"):
+        init_launchable_test_context(items, config.getini("python_files"))
 
     if cli is None:
         raise Exception("cli args is not initialized")
 
-    # call subset
-    # file_list = lc.to_file_list()
-    # hack for testcase omittion
-    # CLI cannot handle filename-only test cases
-    # file_list = list(map(lambda x: (x + "::" + x), file_list))
-
     subset_command = cli.subset.to_command()
     # No intervention in the original testcase collection ( "record-only" mode )
     if len(subset_command) == 0:
         return
 
-    testpath_list = lc.to_testpath_list()
+    # the candidates are files or classes if the granularity is not "case"
+    testpath_list = lc.to_unit_list()
     lc.set_subset_command_request(subset_command, testpath_list)
-    raw_subset_result = subprocess.run(subset_command, input="\r\n".join(
-        testpath_list), stdout=subprocess.PIPE, text=True)
-    if cli.subset.mode == "subset-and-rest":
-        lc.set_subset_command_response(
-            raw_subset_result.stdout, cli.subset.REST_FILE_NAME)
-    else:
-        lc.set_subset_command_response(raw_subset_result.stdout)
+    # read before the result file is overwritten by this session
+    durations = unit_history(load_test_durations(config, cli), {}, lc.granularity)[
+        0] if cli.subset.order != "service" else {}
+    receive_subset(config, subset_command, testpath_list)
+    split_and_order_subset(durations)
+    # the tests of a unit are run together in the collection order
+    lc.expand_subset_units()
     # print("input_file_list=" + str(file_list))
     # print("output_file_list=" + str(lc.subset_list))
     # print("all collected names " + str(lc.to_name_tuple_list()))
+    replace_items(items)
+
+
+# the items of the subset, then of the rest
+def replace_items(items: List[pytest.Function]) -> None:
+    if lc is None:
+        raise Exception("launchable test context is not initialized")
 
     # find testcase , mark category name, and return pytest object
     def find_and_mark(nodeid: str, category: str):
@@ -331,6 +899,90 @@ def pytest_collection_modifyitems(config, items: List[pytest.Function]) -> None:
         for nodeid in lc.rest_list:
             items.append(find_and_mark(nodeid, "rest"))
 
+
+# from the xdist controller, the subset file or the subset command
+def receive_subset(config, subset_command: Tuple[str, ...], testpath_list: List[str]) -> None:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    if lc.xdist_role == "worker" and lc.xdist_dir is not None:
+        with lc.timer.measure("subset request"):
+            raw_subset, raw_rest = xdist_support.exchange_subset(
+                lc.xdist_dir, testpath_list, cli.subset.timeout or None)
+    else:
+        with lc.timer.measure("wait for record session"):
+            lc.wait_for_session()
+        with lc.timer.measure("subset request"):
+            raw_subset, raw_rest = request_subset(
+                config, subset_command, testpath_list)
+    lc.set_subset_command_response(raw_subset, raw_rest=raw_rest)
+    if not lc.is_valid_subset_response():
+        print("launchable subset returned unknown tests. the subset is made locally")
+        raw_subset, raw_rest = local_subset_response(config, testpath_list)
+        lc.set_subset_command_response(raw_subset, raw_rest=raw_rest)
+
+
+# the share of this CI shard, in the order of the configuration
+def split_and_order_subset(durations: Dict[str, float]) -> None:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    if lc.shard_count > 1:
+        # the units are not split
+        shard_durations = load_shard_durations()
+        lc.subset_list = balance_shards(
+            lc.subset_list, shard_durations, lc.shard_count)[lc.shard_index]
+        if lc.rest_list is not None:
+            lc.rest_list = balance_shards(
+                lc.rest_list, shard_durations, lc.shard_count)[lc.shard_index]
+    if cli.subset.order != "service":
+        lc.subset_list = order_testpath_list(
+            lc.subset_list, durations, cli.subset.order)
+        if lc.rest_list is not None:
+            lc.rest_list = order_testpath_list(
+                lc.rest_list, durations, cli.subset.order)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_finish(session) -> None:
+    if lc is None or not lc.enabled or lc.xdist_role is not None or cli is None:
+        return
+    if not is_early_upload_enabled(cli) or lc.rest_list is None:
+        return
+    # count after the other plugins deselected the tests
+    pending: Set[str] = set()
+    for item in session.items:
+        testcase = lc.find_testcase_from_testpath(item.nodeid)
+        if testcase is not None and testcase.launchable_subset_category == "subset":
+            pending.add(lc.subset_key(item.nodeid) or item.nodeid)
+    if 0 < len(pending) < len(session.items):
+        lc.subset_pending = pending
+
+
+def is_early_upload_enabled(cli: CLIArgs) -> bool:
+    # the results in the checkpoints are uploaded together
+    return bool(getattr(cli.record_tests, "early_upload", False)) and cli.subset.mode == "subset-and-rest" \
+        and not is_checkpoint_enabled(cli)
+
+
+def is_checkpoint_enabled(cli: CLIArgs) -> bool:
+    return (getattr(cli.record_tests, "checkpoint_tests", 0) or 0) > 0 or \
+        (getattr(cli.record_tests, "checkpoint_seconds", 0) or 0) > 0
+
+
+# upload the results of the subset while the rest is running
+def start_early_upload() -> None:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    directory = os.path.join(
+        cli.record_tests.result_dir, cli.record_tests.SUBSET_RESULT_DIR_NAME)
+    os.makedirs(directory, exist_ok=True)
+    with lc.timer.measure("early upload"):
+        lc.write_junit_xml(os.path.join(
+            directory, cli.record_tests.RESULT_FILE_NAME), categories=("subset",))
+        lc.wait_for_session()
+        # a separate process, the output of the command must not be mixed with the captured output of the tests
+        lc.early_upload_command = DetachedCommand(cli.record_tests.to_command(directory), os.path.join(
+            directory, cli.record_tests.UPLOAD_LOG_FILE_NAME))
+
 # called for each test case
 # at this stage, 'location' attribute is added to `item`
 # def pytest_runtest_setup(item):
@@ -340,18 +992,36 @@ def pytest_collection_modifyitems(config, items: List[pytest.Function]) -> None:
 
 
 def pytest_runtest_logreport(report: "pytest.TestReport") -> None:
-    if lc is None or not lc.enabled:
+    if lc is None or not lc.enabled or lc.xdist_role == "worker":
         return
-    # sample of nodeid: 'calc_example/math/test_mul.py::TestMul::test_mul_int1'
-    test_path = parse_nodeid(report.nodeid)
-    node = lc.get_node_from_path(test_path.file)
-    test_case = node.find_test_case(
-        test_path.class_name, test_path.fuction_parameters)
-    if test_case == None:
-        print("result node not found class=%s func=%s" %
-              (test_path.class_name, test_path.fuction_parameters))
-    else:
-        test_case.set_result(report)
+    with lc.timer.measure("test report"):
+        # sample of nodeid: 'calc_example/math/test_mul.py::TestMul::test_mul_int1'
+        test_case = lc.find_testcase_from_testpath(report.nodeid)
+        if test_case is None and lc.xdist_role == "controller":
+            test_case = lc.add_testcase_from_testpath(report.nodeid)
+        if test_case is None:
+            print("result node not found nodeid=%s" % report.nodeid)
+        else:
+            test_case.set_result(report)
+            if report.when == "teardown":
+                finish_test_case(test_case, report.nodeid)
+
+
+# the early upload and the checkpoints after the teardown of each test case
+def finish_test_case(test_case: LaunchableTestCase, nodeid: str) -> None:
+    if lc is None:
+        raise Exception("launchable test context is not initialized")
+    if lc.subset_pending is not None and test_case.launchable_subset_category == "subset":
+        lc.subset_pending.discard(lc.subset_key(nodeid) or nodeid)
+        if len(lc.subset_pending) == 0:
+            lc.subset_pending = None
+            start_early_upload()
+    if lc.checkpoints is not None:
+        lc.finished_cases.append(test_case)
+        if lc.checkpoints.is_due(len(lc.finished_cases)):
+            with lc.timer.measure("checkpoint"):
+                lc.write_checkpoint(lc.finished_cases)
+            lc.finished_cases = []
 
 # cleanup session
 
@@ -360,19 +1030,141 @@ def pytest_sessionfinish(session):
     if lc is None:
         raise Exception("launchable test context is not initialized")
 
-    if not lc.enabled:
+    if not lc.enabled or lc.xdist_role == "worker":
         return
+    if cli is None:
+        raise Exception("cli args is not initialized")
+
+    if lc.subset_coordinator is not None:
+        lc.subset_coordinator.stop()
+    if lc.xdist_role == "controller" and lc.xdist_dir is not None:
+        shutil.rmtree(lc.xdist_dir, ignore_errors=True)
+    lc.failure_texts.close()
+    with lc.timer.measure("wait for launchable commands"):
+        lc.wait_for_commands()
     if not os.path.exists(cli.record_tests.result_dir):
         os.makedirs(cli.record_tests.result_dir)
-    report = lc.junit_xml()
     test_result_file = os.path.join(
-        cli.record_tests.result_dir, "test-results.xml")
-    out_strm = open(test_result_file, "w", encoding="utf-8")
-    out_strm.write(etree.tostring(
-        report, encoding="unicode", pretty_print=True))
-    out_strm.close()
-    record_test_command = cli.record_tests.to_command()
-    subprocess.run(record_test_command)
+        cli.record_tests.result_dir, cli.record_tests.RESULT_FILE_NAME)
+    with lc.timer.measure("junit xml"):
+        write_test_result_file(test_result_file)
+        record_test_command = record_tests_command()
+    record_result_history(session.config)
+    upload_test_results(record_test_command)
+    if getattr(session.config.option, "launchable_timing_json", False):
+        lc.timer.write_json(os.path.join(
+            cli.record_tests.result_dir, cli.record_tests.TIMING_FILE_NAME))
+
+
+def write_test_result_file(test_result_file: str) -> None:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    if lc.checkpoints is not None:
+        # the tests not in the checkpoints yet, including the unfinished ones
+        lc.write_checkpoint([testcase for node in lc.test_node_list
+                             for testcase in node.case_list if testcase.result is not None])
+        lc.finished_cases = []
+        # test-results.xml is merged from the shards without loading them at once
+        write_junit_elements(test_result_file, lc.checkpoints.iter_elements(),
+                             lc.junit_testsuite_attributes())
+    elif cli.record_tests.junit_writer == "stream":
+        lc.write_junit_xml(test_result_file)
+    else:
+        report = lc.junit_xml()
+        out_strm = open(test_result_file, "w", encoding="utf-8")
+        out_strm.write(etree.tostring(
+            report, encoding="unicode", pretty_print=True))
+        out_strm.close()
+
+
+# the results not uploaded yet by the early upload or by the sessions killed before
+def record_tests_command() -> Commands:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    if lc.checkpoints is not None:
+        # one upload for the shards of this session and of the sessions killed before
+        return cli.record_tests.to_command(*lc.checkpoints.upload_dirs())
+    if lc.early_upload_command is None:
+        return cli.record_tests.to_command()
+    # test-results.xml has all results, only the rest is uploaded
+    rest_dir = os.path.join(
+        cli.record_tests.result_dir, cli.record_tests.REST_RESULT_DIR_NAME)
+    os.makedirs(rest_dir, exist_ok=True)
+    lc.write_junit_xml(os.path.join(rest_dir, cli.record_tests.RESULT_FILE_NAME),
+                       categories=("rest", "unknown"))
+    # the subset is uploaded again with the rest if the early upload failed.
+    # in async mode, an early upload still running after upload_wait is reported in pytest_terminal_summary
+    with lc.timer.measure("wait for early upload"):
+        exit_code = lc.early_upload_command.wait(
+            None if cli.record_tests.upload == "sync" else cli.record_tests.upload_wait or 0)
+    if exit_code is not None and exit_code != 0:
+        print("failed to upload test results of the subset (exit code %d). see %s. they are uploaded with the rest" % (
+            exit_code, lc.early_upload_command.log_file))
+        lc.early_upload_command = None
+        return cli.record_tests.to_command(rest_dir, os.path.join(
+            cli.record_tests.result_dir, cli.record_tests.SUBSET_RESULT_DIR_NAME))
+    return cli.record_tests.to_command(rest_dir)
+
+
+def record_result_history(config) -> None:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    if lc.history is not None:
+        # recorded with the checkpoints
+        lc.history.close()
+        return
+    history = open_result_history(config, cli)
+    if history is not None:
+        with lc.timer.measure("result history"):
+            history.record(lc.iter_history_results())
+            history.close()
+
+
+def upload_test_results(record_test_command: Commands) -> None:
+    if lc is None or cli is None:
+        raise Exception("launchable test context is not initialized")
+    if cli.record_tests.upload == "async":
+        # the result is reported in pytest_terminal_summary
+        lc.upload_command = DetachedCommand(record_test_command, os.path.join(
+            cli.record_tests.result_dir, cli.record_tests.UPLOAD_LOG_FILE_NAME))
+        if lc.checkpoints is not None:
+            lc.checkpoints.hand_over(lc.upload_command.process.pid)
+    else:
+        result = run_command(record_test_command,
+                             lc.cli_backend, timer=lc.timer)
+        # kept for the next session if the upload failed
+        if lc.checkpoints is not None and result.returncode == 0:
+            lc.checkpoints.remove_uploaded()
+
+
+def pytest_terminal_summary(terminalreporter) -> None:
+    if lc is None or cli is None:
+        return
+    if lc.timer.enabled and getattr(terminalreporter.config.option, "launchable_timing", False):
+        terminalreporter.write_sep("-", "launchable timing")
+        for line in lc.timer.summary_lines():
+            terminalreporter.write_line(line)
+    if lc.upload_command is None and lc.early_upload_command is None:
+        return
+    terminalreporter.write_sep("-", "launchable")
+    if lc.early_upload_command is not None:
+        write_upload_status(terminalreporter, lc.early_upload_command,
+                            "test results of the subset", cli.record_tests.upload_wait or 0)
+    if lc.upload_command is not None:
+        write_upload_status(terminalreporter, lc.upload_command,
+                            "test results", cli.record_tests.upload_wait or 0)
+
+
+def write_upload_status(terminalreporter, command: DetachedCommand, name: str, timeout: float) -> None:
+    exit_code = command.wait(timeout)
+    if exit_code is None:
+        terminalreporter.write_line("%s are still being uploaded in the background (pid %d). see %s" % (
+            name, command.process.pid, command.log_file))
+    elif exit_code == 0:
+        terminalreporter.write_line("%s are uploaded" % name)
+    else:
+        terminalreporter.write_line("failed to upload %s (exit code %d). see %s" % (
+            name, exit_code, command.log_file))
 
 
 def parse_pytest_item(testcase: pytest.Function) -> PytestTestPath:
@@ -392,20 +1184,29 @@ def parse_pytest_item(testcase: pytest.Function) -> PytestTestPath:
     #  'fixturenames': ['a', 'b', 'c'], 'funcargs': {}, '_request': <FixtureRequest for <Function test_params[1-5-6]>>}
 
 
+@memorizer(maxsize=65536)
 def parse_nodeid(nodeid: str) -> PytestTestPath:
     """
     Expect nodeid to be in the format of: "tests/test_b.py::T::m[2-3-4]"
+    Nested classes are kept in the class name: "tests/test_b.py::T::U::m" -> class_name "T::U"
+    Parameters may contain "::" and "[": "tests/test_b.py::m[a::b[0]]" -> parameters "[a::b[0]]"
+    The parsed paths are cached and shared, they must not be modified.
     """
-    testpaths = nodeid.split("::")
+    file, _, names = nodeid.partition("::")
+    parameters = None
+    bracket_index = names.find("[")
+    if bracket_index != -1:
+        names, parameters = names[:bracket_index], names[bracket_index:]
+    class_name, _, function = names.rpartition("::")
+    # the same file, class and function names are shared by many test cases
+    return PytestTestPath(sys.intern(file), sys.intern(class_name) if class_name else None, sys.intern(function), parameters)
 
-    class_name, parameters = None, None
-    if len(testpaths) == 3:
-        file, class_name, testcase = testpaths
-    if len(testpaths) == 2:
-        file, testcase = testpaths
 
-    blacket_index = testcase.find("[")
-    if blacket_index != -1:
-        testcase, parameters = testcase[:blacket_index], testcase[blacket_index:]
-
-    return PytestTestPath(file, class_name, testcase, parameters)
+def launchable_testpath(nodeid: str) -> str:
+    """
+    The test path returned by 'launchable subset' for the nodeid.
+    The pytest runner of launchable splits the nodeid at every "::", and keeps the class
+    only for "file::class::testcase", so "test_b.py::T::U::m" is returned as "test_b.py::m"
+    """
+    parts = nodeid.split("::")
+    return nodeid if len(parts) <= 3 else "::".join((parts[0], parts[-1]))
@@ -0,0 +1,69 @@
+# subset decided locally when the subset service is not available.
+# tests that failed recently come first, then the tests without history, then the shorter tests,
+# as many as fit in the budget of the subset options.
+import re
+from typing import Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+
+from .durations import default_duration
+
+if TYPE_CHECKING:
+    from launchable_cli_args import SubsetArgs
+
+TIME_UNITS = {"w": 7 * 24 * 3600, "d": 24 * 3600, "h": 3600, "m": 60, "s": 1}
+TIME_RE = re.compile(r"(\d+(?:\.\d+)?)([wdhms])")
+
+
+# "30m", "2h30m", "1w3d" or seconds
+def parse_time(value: Union[str, int, float]) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if TIME_RE.sub("", value) != "":
+        raise ValueError("invalid time: %s" % value)
+    return sum(float(amount) * TIME_UNITS[unit] for amount, unit in TIME_RE.findall(value))
+
+
+# "30%" or 30 -> 0.3
+def parse_percentage(value: Union[str, int, float]) -> float:
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    return min(max(float(value) / 100.0, 0.0), 1.0)
+
+
+# return (subset, rest). the rest keeps the original order
+def local_subset(testpath_list: List[str], subset: "SubsetArgs", durations: Dict[str, float],
+                 fail_rates: Dict[str, float]) -> Tuple[List[str], List[str]]:
+    default = default_duration(durations)
+
+    def duration(testpath: str) -> float:
+        return durations.get(testpath, default)
+
+    time: Optional[Union[str, int]] = getattr(subset, "time", None)
+    if time is not None:
+        budget = parse_time(time)
+    else:
+        # no model to estimate the confidence locally. it is treated as the target
+        percentage: Optional[Union[str, int]] = getattr(subset, "target", None)
+        if percentage is None:
+            percentage = getattr(subset, "confidence", 100)
+        budget = parse_percentage(percentage) * \
+            sum(duration(testpath) for testpath in testpath_list)
+
+    priority = sorted(testpath_list, key=lambda testpath: (
+        -fail_rates.get(testpath, 0.0), testpath in durations, duration(testpath)))
+    selected = set()
+    total = 0.0
+    for testpath in priority:
+        d = duration(testpath)
+        if total + d > budget:
+            continue
+        total += d
+        selected.add(testpath)
+    subset_list = [testpath for testpath in priority if testpath in selected]
+    rest_list = [
+        testpath for testpath in testpath_list if testpath not in selected]
+    return subset_list, rest_list
@@ -0,0 +1,79 @@
+# pytest11 entry point of pytest-launchable.
+# this module is loaded in every pytest run where the plugin is installed, so it imports nothing
+# but pytest. the plugin itself (launchable_test_context) is loaded only when --launchable is given.
+
+# same as launchable_command.BACKENDS
+CLI_BACKENDS = ["in-process", "process"]
+
+PLUGIN_NAME = "launchable_test_context"
+
+
+def pytest_addoption(parser):
+    # sample for introducing custom command line option
+    group = parser.getgroup("launchable arguments")
+    group.addoption('--launchable', '--launchable',
+                    action="store_true",
+                    dest="launchable",
+                    help="enable launchable feature")
+    group.addoption('--launchable-conf-path', '--launchable-conf-path',
+                    action="store",
+                    dest="launchable_conf_path",
+                    metavar="",
+                    default=".launchable.d/config.yml",
+                    help="path of launchable test configuration file")
+    group.addoption('--launchable-cli-backend', '--launchable-cli-backend',
+                    action="store",
+                    dest="launchable_cli_backend",
+                    choices=CLI_BACKENDS,
+                    default="process",
+                    help="spawn the launchable command (process), or call launchable in this process (in-process)")
+    group.addoption('--launchable-timing', '--launchable-timing',
+                    action="store_true",
+                    dest="launchable_timing",
+                    help="report the time spent in each phase of the launchable plugin")
+    group.addoption('--launchable-timing-json', '--launchable-timing-json',
+                    action="store_true",
+                    dest="launchable_timing_json",
+                    help="write the time spent in each phase of the launchable plugin to a JSON file in the result directory")
+    group.addoption('--launchable-shard-index', '--launchable-shard-index',
+                    action="store",
+                    dest="launchable_shard_index",
+                    type=int,
+                    metavar="",
+                    default=0,
+                    help="run the N-th (0 origin) of the CI shards of the subset")
+    group.addoption('--launchable-shard-count', '--launchable-shard-count',
+                    action="store",
+                    dest="launchable_shard_count",
+                    type=int,
+                    metavar="",
+                    default=1,
+                    help="number of the CI shards, the subset is split into shards of about the same duration. "
+                    "needs --launchable-subset-file")
+    group.addoption('--launchable-subset-file', '--launchable-subset-file',
+                    action="store",
+                    dest="launchable_subset_file",
+                    metavar="",
+                    default=None,
+                    help="read the subset from this file instead of calling the subset service. "
+                    "if it does not exist, the subset is written to it, to be shared by the CI shards. "
+                    "give it as --launchable-subset-file=PATH, "
+                    "or an existing file outside the project changes the rootdir of pytest")
+
+
+def is_enabled(config) -> bool:
+    option = getattr(config, "option", None)
+    if option is None or not getattr(option, "launchable", False):
+        return False
+    # nothing is run nor recorded with --collect-only (--co)
+    return not getattr(option, "collectonly", False)
+
+
+def pytest_configure(config) -> None:
+    if not is_enabled(config):
+        return
+    from . import launchable_test_context
+    # it may be registered already with -p
+    if not config.pluginmanager.is_registered(launchable_test_context):
+        # pytest_configure of the registered plugin is called here, because the hook is historic
+        config.pluginmanager.register(launchable_test_context, PLUGIN_NAME)
@@ -0,0 +1,79 @@
+# durations and outcomes of the last runs of each test.
+# other features (ordering, fallback subset, sharding) read this instead of parsing old JUnit files
+import sqlite3
+from array import array
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+OUTCOME_CODES = {"passed": "p", "failed": "f", "skipped": "s"}
+
+
+class HistoryStats(NamedTuple):
+    runs: int
+    p50: float
+    p95: float
+    fail_rate: float
+    last_outcome: str
+
+
+class ResultHistory:
+    """last 'max_runs' results of each test path in a SQLite file, with rolling aggregates"""
+
+    def __init__(self, path: str, max_runs: int):
+        self.path = path
+        self.max_runs = max_runs
+        self.connection = sqlite3.connect(path)
+        # the history can be rebuilt, durability is not worth fsync on every session
+        self.connection.execute("PRAGMA synchronous=OFF")
+        # durations are the array('d') bytes, outcomes are the codes of OUTCOME_CODES. both are oldest first
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS test_history (
+            testpath TEXT PRIMARY KEY,
+            durations BLOB NOT NULL,
+            outcomes TEXT NOT NULL,
+            p50 REAL NOT NULL,
+            p95 REAL NOT NULL,
+            fail_rate REAL NOT NULL) WITHOUT ROWID""")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    # results are (test path, outcome, duration). only the rows of the given test paths are read and written
+    def record(self, results: Iterable[Tuple[str, str, float]]) -> None:
+        with self.connection:
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS session_results (testpath TEXT PRIMARY KEY, outcome TEXT, duration REAL)")
+            self.connection.execute("DELETE FROM session_results")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO session_results VALUES (?, ?, ?)", results)
+            rows = self.connection.execute("""SELECT s.testpath, s.outcome, s.duration, h.durations, h.outcomes
+                FROM session_results s LEFT JOIN test_history h ON s.testpath = h.testpath ORDER BY s.testpath""").fetchall()
+            self.connection.executemany("INSERT OR REPLACE INTO test_history VALUES (?, ?, ?, ?, ?, ?)",
+                                        [self.updated_row(*row) for row in rows])
+            self.connection.execute("DELETE FROM session_results")
+
+    def updated_row(self, testpath: str, outcome: str, duration: float,
+                    previous_durations: Optional[bytes], previous_outcomes: Optional[str]):
+        durations = array("d")
+        outcomes = OUTCOME_CODES.get(outcome, "f")
+        if previous_durations is not None and previous_outcomes is not None:
+            durations.frombytes(previous_durations)
+            outcomes = (previous_outcomes + outcomes)[-self.max_runs:]
+            if len(durations) >= self.max_runs:
+                del durations[:len(durations) - self.max_runs + 1]
+        durations.append(duration)
+        sorted_durations = sorted(durations)
+        n = len(sorted_durations)
+        # nearest-rank percentiles. index of p percentile is ceil(n * p / 100) - 1
+        return (testpath, durations.tobytes(), outcomes, sorted_durations[(n + 1) // 2 - 1],
+                sorted_durations[-(-n * 95 // 100) - 1], outcomes.count("f") / len(outcomes))
+
+    # test path -> median duration
+    def durations(self) -> Dict[str, float]:
+        return dict(self.connection.execute("SELECT testpath, p50 FROM test_history"))
+
+    def stats(self) -> Dict[str, HistoryStats]:
+        r: Dict[str, HistoryStats] = {}
+        for testpath, outcomes, p50, p95, fail_rate in self.connection.execute(
+                "SELECT testpath, outcomes, p50, p95, fail_rate FROM test_history"):
+            r[testpath] = HistoryStats(
+                len(outcomes), p50, p95, fail_rate, outcomes[-1])
+        return r
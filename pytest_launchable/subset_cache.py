@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from launchable_cli_args import SubsetArgs
+
+# (raw subset response or its lines, rest list)
+SubsetResponse = Tuple[Union[str, List[str]], Optional[List[str]]]
+
+
+class SubsetCache:
+    """subset responses stored as json files, evicted by age and by number of entries"""
+
+    def __init__(self, directory: str, ttl: int, max_entries: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @classmethod
+    def make_key(cls, build_id: str, subset: "SubsetArgs", testpath_list: List[str]) -> str:
+        testpath_hash = hashlib.sha256()
+        for testpath in testpath_list:
+            testpath_hash.update(testpath.encode("utf-8"))
+            testpath_hash.update(b"\n")
+        options = [build_id, subset.mode, getattr(subset, "target", None), getattr(subset, "confidence", None),
+                   getattr(subset, "time", None), getattr(subset, "granularity", "case"), testpath_hash.hexdigest()]
+        return hashlib.sha256(json.dumps(options).encode("utf-8")).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[SubsetResponse]:
+        path = self.entry_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        # keep the mtime of the creation. eviction by size removes the oldest entries first
+        return entry["raw_subset"], entry["raw_rest"]
+
+    def put(self, key: str, raw_subset: Union[str, List[str]], raw_rest: Optional[List[str]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.entry_path(key)
+        # write to a temporary file first so that a concurrent reader never sees a partial entry
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"raw_subset": raw_subset, "raw_rest": raw_rest}, file)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+                if now - mtime > self.ttl:
+                    os.remove(path)
+                else:
+                    entries.append((mtime, path))
+            except OSError:
+                pass  # removed by another process
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# subset response saved as a CI artifact, so that all CI shards run the same subset.
+# the durations of the candidates are saved with it, every shard splits the subset with the same durations
+def save_subset_file(path: str, response: SubsetResponse, engine: str, durations: Dict[str, float]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump({"raw_subset": response[0], "raw_rest": response[1],
+                   "engine": engine, "durations": durations}, file)
+    os.replace(tmp_path, path)
+
+
+# (response, engine, durations)
+def load_subset_file(path: str) -> Tuple[SubsetResponse, str, Dict[str, float]]:
+    with open(path, encoding="utf-8") as file:
+        entry = json.load(file)
+    return (entry["raw_subset"], entry["raw_rest"]), entry.get("engine", "service"), entry.get("durations", {})
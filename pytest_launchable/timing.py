@@ -0,0 +1,85 @@
+import contextlib
+import json
+import threading
+import time
+from typing import ContextManager, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from launchable_cli_args.memorizer import memorizer_stats
+
+if TYPE_CHECKING:
+    from launchable_cli_args import Commands
+
+# shared by all disabled timers, so that measure() allocates nothing
+_null_context = contextlib.nullcontext()
+
+
+class PhaseTimer:
+    """accumulate the wall clock time spent in each phase of the plugin"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # phase name -> [number of calls, total seconds], in the order of the first call
+        self.phases: Dict[str, List[float]] = {}
+        # launchable commands are measured in background threads
+        self.lock = threading.Lock()
+
+    def measure(self, phase: str) -> ContextManager:
+        if not self.enabled:
+            return _null_context
+        return self._measure(phase)
+
+    @contextlib.contextmanager
+    def _measure(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self.lock:
+            total = self.phases.get(phase)
+            if total is None:
+                self.phases[phase] = [1, seconds]
+            else:
+                total[0] += 1
+                total[1] += seconds
+
+    # (phase, number of calls, total seconds)
+    def results(self) -> List[Tuple[str, int, float]]:
+        with self.lock:
+            return [(phase, int(total[0]), total[1]) for phase, total in self.phases.items()]
+
+    def summary_lines(self) -> List[str]:
+        lines = ["%-32s %8s %10s" % ("phase", "calls", "seconds")]
+        for phase, calls, seconds in self.results():
+            lines.append("%-32s %8d %10.3f" % (phase, calls, seconds))
+        stats = memorizer_stats()
+        if len(stats) > 0:
+            lines.append("%-48s %8s %8s %8s" %
+                         ("memorized function", "hits", "misses", "size"))
+            for name, hits, misses, size in stats:
+                lines.append("%-48s %8d %8d %8d" % (name, hits, misses, size))
+        return lines
+
+    def write_json(self, path: str) -> None:
+        phases = [{"phase": phase, "calls": calls, "seconds": seconds}
+                  for phase, calls, seconds in self.results()]
+        memorizers = [{"function": name, "hits": hits, "misses": misses, "size": size}
+                      for name, hits, misses, size in memorizer_stats()]
+        with open(path, "w") as f:
+            json.dump({"phases": phases, "memorizers": memorizers}, f, indent=2)
+
+
+# "launchable record build" for ("launchable", "record", "build", "--name", ...)
+def command_phase(command: "Commands") -> str:
+    words: List[str] = []
+    for arg in command[:3]:
+        if arg is None or str(arg).startswith("-"):
+            break
+        words.append(str(arg))
+    return " ".join(words)
+
+
+def measure_command(timer: Optional[PhaseTimer], command: "Commands") -> ContextManager:
+    return timer.measure(command_phase(command)) if timer is not None else _null_context
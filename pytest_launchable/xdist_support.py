@@ -0,0 +1,114 @@
+# pytest-xdist integration
+#
+# with xdist, only the controller calls the launchable CLI. the controller does not collect tests,
+# so the workers hand the collected test paths over to the controller through files in a directory
+# shared by the processes, and wait for the subset decided by the controller.
+# test reports are forwarded to the controller by xdist itself.
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+import pytest
+
+from .subset_cache import SubsetResponse
+
+SUBSET_REQUEST_FILE_NAME = "subset_request.json"
+SUBSET_RESPONSE_FILE_NAME = "subset_response.json"
+# key of config.workerinput
+WORKERINPUT_KEY = "launchable_xdist_dir"
+# seconds that the workers wait for the controller in addition to the timeout of the subset command.
+# the controller records the session before the subset, and makes the subset locally on timeout
+SUBSET_WAIT_MARGIN = 60
+
+
+def is_xdist_worker(config) -> bool:
+    return hasattr(config, "workerinput")
+
+
+def is_xdist_controller(config) -> bool:
+    return not is_xdist_worker(config) and getattr(config.option, "dist", "no") != "no"
+
+
+# None if the controller does not share the directory
+def xdist_shared_dir(config) -> Optional[str]:
+    return config.workerinput.get(WORKERINPUT_KEY)
+
+
+# the shared directory is on the file system of the controller, which remote workers (--tx ssh=... or socket=...) can not read
+def has_remote_workers(config) -> bool:
+    for spec in getattr(config.option, "tx", None) or ():
+        if "ssh=" in spec or "socket=" in spec:
+            return True
+    return False
+
+
+def write_json_atomically(path: str, data: Any) -> None:
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+# return None if stopped or if the file does not appear in timeout seconds
+def wait_json(path: str, stopped: Optional[threading.Event] = None, interval: float = 0.05,
+              timeout: Optional[float] = None) -> Any:
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while not os.path.exists(path):
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        if stopped is not None and stopped.wait(interval):
+            return None
+        if stopped is None:
+            time.sleep(interval)
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+class SubsetCoordinator:
+    """controller side. receive the test paths from a worker and decide the subset in a background thread"""
+
+    def __init__(self, directory: str, request_subset: Callable[[List[str]], SubsetResponse]):
+        self.directory = directory
+        self.request_subset = request_subset
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        request = wait_json(os.path.join(
+            self.directory, SUBSET_REQUEST_FILE_NAME), self.stopped)
+        if request is None:
+            return
+        response_path = os.path.join(
+            self.directory, SUBSET_RESPONSE_FILE_NAME)
+        try:
+            raw_subset, raw_rest = self.request_subset(
+                request["testpath_list"])
+        except Exception as e:
+            # let the workers fail instead of waiting forever
+            write_json_atomically(response_path, {"error": repr(e)})
+            return
+        write_json_atomically(
+            response_path, {"raw_subset": raw_subset, "raw_rest": raw_rest})
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+# worker side. every worker collects the same tests, so it does not matter which worker's request is used.
+# timeout is the timeout of the subset command, None waits for the controller forever
+def exchange_subset(directory: str, testpath_list: List[str], timeout: Optional[float] = None) -> SubsetResponse:
+    write_json_atomically(os.path.join(directory, SUBSET_REQUEST_FILE_NAME), {
+                          "testpath_list": testpath_list})
+    wait_timeout = timeout + SUBSET_WAIT_MARGIN if timeout is not None else None
+    response = wait_json(os.path.join(directory, SUBSET_RESPONSE_FILE_NAME), timeout=wait_timeout)
+    if response is None:
+        raise pytest.UsageError(
+            "launchable subset was not received from xdist controller in %s seconds" % wait_timeout)
+    if "error" in response:
+        raise Exception(
+            "launchable subset failed on xdist controller: %s" % response["error"])
+    return response["raw_subset"], response["raw_rest"]
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+from pytest_launchable.checkpoint import Checkpoints, read_owner, write_owner
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def write_empty_shard(path: str) -> None:
+    with open(path, "w") as f:
+        f.write("<testsuites/>")
+
+
+def test_is_due(tmp_path) -> None:
+    checkpoints = Checkpoints(str(tmp_path), "build1", max_tests=2)
+    assert not checkpoints.is_due(0)
+    assert not checkpoints.is_due(1)
+    assert checkpoints.is_due(2)
+    checkpoints = Checkpoints(str(tmp_path), "build1", max_seconds=1)
+    assert not checkpoints.is_due(1)
+    checkpoints.last_time -= 1
+    assert checkpoints.is_due(1)
+
+
+def test_orphans(tmp_path) -> None:
+    directory = str(tmp_path / "checkpoints")
+    crashed = Checkpoints(directory, "build1")
+    crashed.write_shard(write_empty_shard)
+    other_build = Checkpoints(directory, "build2")
+    other_build.write_shard(write_empty_shard)
+    empty = Checkpoints(directory, "build1")
+    for checkpoints in (crashed, other_build, empty):
+        owner = read_owner(checkpoints.run_dir) or {}
+        owner["pid"] = dead_pid()
+        write_owner(checkpoints.run_dir, owner)
+    running = Checkpoints(directory, "build1")
+    running.write_shard(write_empty_shard)
+
+    checkpoints = Checkpoints(directory, "build1")
+    assert checkpoints.upload_dirs() == [
+        checkpoints.run_dir, crashed.run_dir]
+    assert not os.path.exists(other_build.run_dir)
+    assert not os.path.exists(empty.run_dir)
+    assert os.path.exists(running.run_dir)
+
+    # removed by the next session when the upload is finished
+    checkpoints.hand_over(dead_pid())
+    Checkpoints(directory, "build1")
+    assert not os.path.exists(checkpoints.run_dir)
+    assert not os.path.exists(crashed.run_dir)
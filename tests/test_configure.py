@@ -35,3 +35,40 @@ def test_command() -> None:
     args.subset.mode = "subset-and-rest"
     assert args.subset.to_command() == ("launchable", "subset", "--build", "XXX",
                                         "--confidence", 99, "--rest", args.subset.REST_FILE_NAME, "pytest")
+
+    # a part of the results
+    assert args.record_tests.to_command("dir/subset")[-1] == "dir/subset"
+
+    # file granularity uses the file test runner
+    args.subset.granularity = "file"
+    assert args.subset.to_command()[-1] == "file"
+
+
+def test_from_yaml_cache(tmp_path, monkeypatch, capsys) -> None:
+    from launchable_cli_args.cli_args import load_config_state
+    monkeypatch.setenv("LAUNCHABLE_TOKEN", "XXX")
+    conf_file_path = str(tmp_path / "config.yml")
+    args = CLIArgs.auto_configure("tests")
+    args.record_build.source = os.getcwd()
+    args.write_as_yaml(conf_file_path)
+
+    misses = load_config_state.misses
+    args = CLIArgs.from_yaml(conf_file_path)
+    assert args.error_counter.error_count == 0
+    assert "__line__" not in args.source_object, "line numbers are not needed without errors"
+    assert args.subset.mode == "record-only"
+    assert args.launchable_token == "XXX"
+    args.subset.mode = "subset"
+    # the second load is not parsed, and not affected by the change of the first one
+    args = CLIArgs.from_yaml(conf_file_path)
+    assert args.subset.mode == "record-only"
+    assert load_config_state.misses == misses + 1
+
+    # the errors have line numbers
+    with open(conf_file_path, "a") as f:
+        f.write("  history_runs: forever\n")
+    args = CLIArgs.from_yaml(conf_file_path)
+    assert load_config_state.misses == misses + 2
+    assert args.error_counter.error_messages == [
+        "line %d attribute history_runs: forever is not an integer" % len(open(conf_file_path).readlines())]
+    assert "is not an integer" in capsys.readouterr().out
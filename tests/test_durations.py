@@ -0,0 +1,52 @@
+from pytest_launchable.durations import balance_shards, launchable_test_path_to_testpath, load_junit_durations, \
+    order_testpath_list
+
+JUNIT_XML = """<testsuites><testsuite name="pytest">
+<testcase classname="test_a" name="f" time="1.5" setup_time="0.25" teardown_time="0.25"
+    launchable_test_path="file=test_a.py#testcase=f"/>
+<testcase classname="test_b.T" name="m[1]" time="3" setup_time="0" teardown_time="0"
+    launchable_test_path="file=test_b.py#class=T#testcase=m[1]"/>
+<testcase classname="test_b.T" name="m[2]" time="0.5" setup_time="0" teardown_time="0"
+    launchable_test_path="file=test_b.py#class=T#testcase=m[2]"/>
+</testsuite></testsuites>"""
+
+
+def test_launchable_test_path_to_testpath():
+    assert launchable_test_path_to_testpath(
+        "file=test_a.py#testcase=f") == "test_a.py::f"
+    assert launchable_test_path_to_testpath(
+        "file=test_b.py#class=T#testcase=m[a#b]") == "test_b.py::T::m[a#b]"
+    assert launchable_test_path_to_testpath("") == ""
+
+
+def test_load_junit_durations(tmp_path):
+    path = tmp_path / "test-results.xml"
+    path.write_text(JUNIT_XML)
+    assert load_junit_durations(str(path)) == {
+        "test_a.py::f": 2.0, "test_b.py::T::m[1]": 3.0, "test_b.py::T::m[2]": 0.5}
+    assert load_junit_durations(str(tmp_path / "missing.xml")) == {}
+
+
+def test_order_testpath_list():
+    durations = {"a": 2.0, "b": 3.0, "c": 0.5}
+    testpath_list = ["c", "new", "a", "b"]
+    assert order_testpath_list(
+        testpath_list, durations, "service") == testpath_list
+    # "new" has the median duration 2.0, and stays before "a"
+    assert order_testpath_list(testpath_list, durations, "longest-first") == [
+        "b", "new", "a", "c"]
+    assert order_testpath_list(testpath_list, durations, "shortest-first") == [
+        "c", "new", "a", "b"]
+
+
+def test_balance_shards():
+    durations = {"a": 5.0, "b": 4.0, "c": 3.0, "d": 2.0, "e": 2.0}
+    testpath_list = ["e", "d", "c", "b", "a", "new"]
+    shards = balance_shards(testpath_list, durations, 2)
+    # a + new (median 3.0) + e = 10, b + c + d = 9. the order is kept
+    assert shards == [["e", "a", "new"], ["d", "c", "b"]]
+    # the same split for any order of the input
+    assert balance_shards(list(reversed(testpath_list)), durations, 2) == [
+        list(reversed(shard)) for shard in shards]
+    assert balance_shards(testpath_list, durations, 1) == [testpath_list]
+    assert balance_shards([], durations, 3) == [[], [], []]
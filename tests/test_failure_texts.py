@@ -0,0 +1,50 @@
+from pytest_launchable.failure_texts import FailureTexts
+
+
+def test_no_limit() -> None:
+    texts = FailureTexts()
+    a = texts.add("x" * 1000)
+    assert a == "x" * 1000
+    # identical texts are kept once
+    assert texts.add("".join(["x"] * 1000)) is a
+    assert texts.total_size == 1000
+
+
+def test_limits(tmp_path) -> None:
+    spill_path = tmp_path / "result" / "failures.txt"
+    texts = FailureTexts(test_limit=10, total_limit=25,
+                         spill_path=str(spill_path))
+    assert texts.add("short") == "short"
+    long_text = "0123456789abcdef"
+    truncated = texts.add(long_text)
+    assert truncated.startswith("0123456789\n... 6 characters truncated")
+    assert "failures.txt" in truncated
+    # the rest of the total limit
+    assert texts.add("ABCDEFGHIJKL").startswith(
+        "ABCDEFGHIJ\n... 2 characters truncated")
+    assert texts.add("abc").startswith("\n... 3 characters truncated")
+    texts.close()
+
+    spilled = spill_path.read_text()
+    assert long_text in spilled
+    assert "ABCDEFGHIJKL" in spilled
+    assert "short" not in spilled
+
+
+def test_remove() -> None:
+    texts = FailureTexts()
+    written = texts.add("written")
+    running = texts.add("running")
+    texts.remove(written, None, "unknown")
+    assert list(texts.texts.values()) == [running]
+    assert texts.add("running") is running
+
+
+def test_truncated_without_spill() -> None:
+    texts = FailureTexts(test_limit=10)
+    a = texts.add("0123456789 first failure")
+    b = texts.add("0123456789 second failure")
+    assert a.startswith("0123456789\n... 14 characters truncated")
+    assert a != b
+    texts.remove(a)
+    assert list(texts.texts.values()) == [b]
@@ -0,0 +1,54 @@
+import os
+import subprocess
+from launchable_cli_args import git_commit
+from launchable_cli_args.git_commit import abbreviate, abbreviate_persisted, read_head, resolve_commit_hash
+from launchable_cli_args.memorizer import PERSIST_DIR_ENV
+
+
+def git(cwd, *args) -> str:
+    env = dict(os.environ, GIT_AUTHOR_NAME="a", GIT_AUTHOR_EMAIL="a@example.com",
+               GIT_COMMITTER_NAME="a", GIT_COMMITTER_EMAIL="a@example.com")
+    return subprocess.run(("git",) + args, cwd=cwd, env=env, check=True,
+                          stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+def test_resolve_commit_hash(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv(PERSIST_DIR_ENV, str(tmp_path / "memorizer"))
+    abbreviate_persisted.cache_clear()
+    repo = str(tmp_path / "repo")
+    os.makedirs(os.path.join(repo, "tests"))
+    git(repo, "init", "-q")
+    for i in range(100):
+        with open(os.path.join(repo, "tests", "test_%d.py" % i), "w") as f:
+            f.write("x = %d\n" % i)
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "first")
+
+    # loose objects and refs
+    assert read_head(repo) == git(repo, "rev-parse", "HEAD")
+    assert resolve_commit_hash(os.path.join(repo, "tests")) == git(
+        repo, "rev-parse", "--short", "HEAD")
+
+    # the hash resolved by a previous session is read from the persisted file
+    abbreviate_persisted.cache_clear()
+    with monkeypatch.context() as m:
+        m.setattr(git_commit, "abbreviate", None)
+        assert resolve_commit_hash(repo) == git(
+            repo, "rev-parse", "--short", "HEAD")
+
+    # packed objects and refs
+    git(repo, "commit", "-q", "--allow-empty", "-m", "second")
+    git(repo, "gc", "-q")
+    git(repo, "pack-refs", "--all")
+    full_hash = git(repo, "rev-parse", "HEAD")
+    assert read_head(repo) == full_hash
+    assert abbreviate(repo, full_hash) == git(
+        repo, "rev-parse", "--short", "HEAD")
+    git(repo, "config", "core.abbrev", "12")
+    assert abbreviate(repo, full_hash) == full_hash[:12]
+
+    # worktree
+    worktree = str(tmp_path / "worktree")
+    git(repo, "worktree", "add", "-q", "--detach", worktree, "HEAD~1")
+    assert read_head(worktree) == git(worktree, "rev-parse", "HEAD")
+    assert read_head(worktree) != full_hash
@@ -0,0 +1,115 @@
+import importlib.util
+import logging
+import subprocess
+import sys
+import threading
+import pytest
+from pytest_launchable import launchable_command
+from pytest_launchable.launchable_command import BackgroundCommands, DetachedCommand, LineReader, LineWriter, \
+    resolve_backend, run_command, stream_command, thread_std_streams
+
+
+def test_background_commands(tmp_path):
+    log = tmp_path / "log.txt"
+    # the second command sees the output of the first one
+    commands = BackgroundCommands(
+        (sys.executable, "-c", "open(%r, 'w').write('build')" % str(log)),
+        (sys.executable, "-c", "import sys; sys.exit(open(%r).read() != 'build')" % str(log)))
+    assert commands.wait(timeout=60)
+    assert [r.returncode for r in commands.results] == [0, 0]
+
+
+def test_detached_command(tmp_path):
+    log = tmp_path / "upload.log"
+    command = DetachedCommand(
+        (sys.executable, "-c", "print('uploaded')"), str(log))
+    assert command.wait(60) == 0
+    assert log.read_text().strip() == "uploaded"
+
+    command = DetachedCommand(
+        (sys.executable, "-c", "import time; time.sleep(60)"), str(log))
+    assert command.wait(0.1) is None
+    command.process.kill()
+    command.process.wait()
+
+
+def test_run_in_process(monkeypatch):
+    pytest.importorskip("launchable")
+    result = run_command(("launchable", "--version"),
+                         "in-process", capture_output=True)
+    assert result.returncode == 0
+    assert "launchable-cli" in result.stdout
+
+    result = run_command(("launchable", "no-such-command"), "in-process")
+    assert result.returncode == 2
+    # spawned while another in-process command is running
+    with launchable_command.in_process_lock:
+        result = run_command(("launchable", "--version"), "in-process", capture_output=True)
+    assert "launchable-cli" in result.stdout
+
+    # the exit code of ctx.exit() is returned without standalone_mode
+    from launchable.__main__ import main  # type: ignore
+    monkeypatch.setattr(main, "main", lambda **kwargs: 3)
+    assert run_command(("launchable", "verify"), "in-process").returncode == 3
+
+
+def test_run_in_process_isolation():
+    pytest.importorskip("launchable")
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    level = root.level
+    original_stdout = sys.stdout
+    writer = LineWriter()
+    # the output of the other threads is not captured by the command
+    with thread_std_streams(None, writer):
+        thread = threading.Thread(target=lambda: print("other thread"))
+        thread.start()
+        thread.join()
+        print("command thread")
+    assert writer.finish() == ["command thread"]
+    assert sys.stdout is original_stdout
+
+    # logging.basicConfig() of launchable adds a handler only if the root logger has none
+    root.handlers[:] = []
+    try:
+        result = run_command(("launchable", "--log-level", "debug", "--version"),
+                             "in-process", capture_output=True)
+        assert root.handlers == []
+        assert root.level == level
+    finally:
+        root.handlers[:] = handlers
+    assert "launchable-cli" in result.stdout
+    assert sys.stdout is original_stdout
+
+
+def test_resolve_backend():
+    assert resolve_backend("process") == "process"
+    if importlib.util.find_spec("launchable") is not None:
+        assert resolve_backend("in-process") == "in-process"
+
+
+def test_stream_command():
+    # reverse the lines of stdin after reading all of them
+    script = "import sys; lines = sys.stdin.read().split(); print(); print('\\n'.join(reversed(lines)))"
+    lines = ["test_a.py::f[%d]" % i for i in range(10000)]
+    returncode, output = stream_command(
+        (sys.executable, "-c", script), "process", iter(lines), timeout=60)
+    assert returncode == 0
+    assert output == list(reversed(lines))
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        stream_command((sys.executable, "-c", "import time; time.sleep(60)"),
+                       "process", iter(lines), timeout=0.5)
+
+
+def test_line_reader_and_writer():
+    reader = LineReader(iter(["a", "b", "c"]))
+    assert reader.read(0) == ""
+    assert reader.read(3) == "a\nb"
+    assert list(reader) == ["\n", "c\n"]
+    assert reader.read() == ""
+
+    writer = LineWriter()
+    writer.write("a\n\n  b")
+    writer.write("c\r\nd")
+    assert writer.finish() == ["a", "bc", "d"]
@@ -1,6 +1,11 @@
+import gzip
+import os
 from typing import Optional, Callable
 import pytest
-from pytest_launchable.launchable_test_context import PytestTestPath, init_launchable_test_context, parse_pytest_item
+from lxml import etree  # type: ignore
+from pytest_launchable.checkpoint import Checkpoints, shard_files
+from pytest_launchable.launchable_test_context import PytestTestPath, init_launchable_test_context, parse_nodeid, \
+    parse_pytest_item, unit_history, write_junit_elements
 
 
 def f():
@@ -32,6 +37,25 @@ class PseudoPytest:
             self._idlist = [parameters]
 
 
+class PseudoReport:
+    """make pseudo pytest report"""
+
+    def __init__(self, nodeid: str, when: str, outcome: str = "passed", duration: float = 0.5, longrepr: Optional[str] = None):
+        self.nodeid = nodeid
+        self.when = when
+        self.outcome = outcome
+        self.duration = duration
+        self.longrepr = longrepr
+
+
+def set_results(lc, nodeid: str, outcome: str = "passed", longrepr: Optional[str] = None):
+    testcase = lc.find_testcase_from_testpath(nodeid)
+    testcase.set_result(PseudoReport(nodeid, "setup", duration=0.25))
+    testcase.set_result(PseudoReport(
+        nodeid, "call", outcome, 1.5, longrepr))
+    testcase.set_result(PseudoReport(nodeid, "teardown", duration=0.125))
+
+
 def test_parse_pytest_item():
     """Provide only the necessary attributes."""
     assert PytestTestPath("test_a.py", None, "f", None) == parse_pytest_item(
@@ -43,6 +67,22 @@ def test_parse_pytest_item():
         PseudoPytest("test_b.py", "m", t.m, "2-3-4"))
 
 
+def test_parse_nodeid():
+    assert parse_nodeid("tests/test_a.py::f") == PytestTestPath(
+        "tests/test_a.py", None, "f", None)
+    # nested classes
+    assert parse_nodeid("test_b.py::T::U::m[1]") == PytestTestPath(
+        "test_b.py", "T::U", "m", "[1]")
+    # parameters with "::" and "["
+    assert parse_nodeid("test_b.py::T::m[a::b[0]]") == PytestTestPath(
+        "test_b.py", "T", "m", "[a::b[0]]")
+    assert parse_nodeid("test_a.py::f[::]") == PytestTestPath(
+        "test_a.py", None, "f", "[::]")
+    # file names are shared
+    assert parse_nodeid("".join(["test_a.py::", "g"])).file is parse_nodeid(
+        "test_a.py::f").file
+
+
 def test_launchable_context():
     t = T()
     pytest_list = [PseudoPytest("test_a.py", "f", f), PseudoPytest(
@@ -54,3 +94,172 @@ def test_launchable_context():
     for i in range(len(pytest_list)):
         assert lc.find_testcase_from_testpath(
             testpath_list[i]).pytest_item == pytest_list[i]
+
+
+def test_launchable_context_index():
+    t = T()
+    pytest_list = [PseudoPytest("test_b.py", "m", t.m, "1"), PseudoPytest("test_a.py", "f", f),
+                   PseudoPytest("test_b.py", "m", t.m, "0")]
+    lc = init_launchable_test_context(pytest_list)
+    # collection order is kept
+    assert lc.to_file_list() == ["test_b.py", "test_a.py"]
+    assert lc.to_testpath_list() == ["test_b.py::T::m[1]",
+                                     "test_b.py::T::m[0]", "test_a.py::f"]
+    node = lc.get_node_from_path("test_b.py")
+    assert node.find_test_case("T", "m[0]").pytest_item == pytest_list[2]
+    assert node.find_test_case(None, "m[0]") is None
+    assert lc.find_testcase_from_testpath("test_a.py::g") is None
+
+
+def test_write_junit_xml(tmp_path):
+    t = T()
+    pytest_list = [PseudoPytest("test_a.py", "f", f), PseudoPytest("test_b.py", "m", t.m),
+                   PseudoPytest("test_b.py", "m", t.m, "2-3-4")]
+    lc = init_launchable_test_context(pytest_list)
+    set_results(lc, "test_a.py::f")
+    set_results(lc, "test_b.py::T::m[2-3-4]", "failed", "assert <1> & 2\n")
+    expected = etree.tostring(lc.junit_xml(), encoding="unicode")
+
+    path = tmp_path / "test-results.xml"
+    lc.write_junit_xml(str(path))
+    assert path.read_text(encoding="utf-8") == expected
+
+    gz_path = tmp_path / "test-results.xml.gz"
+    lc.write_junit_xml(str(gz_path), compress=True)
+    assert gzip.decompress(gz_path.read_bytes()).decode("utf-8") == expected
+
+    # the tests of the subset
+    lc.find_testcase_from_testpath(
+        "test_b.py::T::m[2-3-4]").launchable_subset_category = "subset"
+    lc.write_junit_xml(str(path), categories=("subset",))
+    testcases = etree.parse(str(path)).findall(".//testcase")
+    assert [e.get("name") for e in testcases] == ["m[2-3-4]"]
+
+    # no test case has a result
+    lc = init_launchable_test_context(pytest_list)
+    lc.write_junit_xml(str(path))
+    assert path.read_text(encoding="utf-8") == etree.tostring(
+        lc.junit_xml(), encoding="unicode")
+
+
+def test_set_result():
+    pytest_list = [PseudoPytest("test_a.py", "f", f)]
+    lc = init_launchable_test_context(pytest_list)
+    set_results(lc, "test_a.py::f", "failed", "assert False\n")
+    testcase = lc.find_testcase_from_testpath("test_a.py::f")
+    # the reports are not kept
+    assert not hasattr(testcase, "__dict__")
+    assert testcase.history_result() == ("test_a.py::f", "failed", 1.875)
+    element = testcase.junit_element()
+    assert element.get("time") == "1.5"
+    assert element.get("setup_time") == "0.25"
+    assert element.get("teardown_time") == "0.125"
+    assert element[0].tag == "failure"
+    assert element[0].text == "assert False\n"
+
+    # skipped at setup
+    lc = init_launchable_test_context(pytest_list)
+    testcase = lc.find_testcase_from_testpath("test_a.py::f")
+    assert testcase.history_result() is None
+    testcase.set_result(PseudoReport("test_a.py::f", "setup", "skipped"))
+    testcase.set_result(PseudoReport("test_a.py::f", "teardown"))
+    assert testcase.history_result() == ("test_a.py::f", "skipped", 1.0)
+    assert testcase.junit_element() is None
+
+
+def test_nested_class():
+    items = [PseudoPytest("test_b.py", "m", T().m), PseudoPytest("test_b.py", "m", T().m)]
+    items[0].nodeid = "test_b.py::T::U::m[a::b]"
+    items[1].nodeid = "test_b.py::T::V::n"
+    lc = init_launchable_test_context(items)
+    assert lc.to_testpath_list() == [
+        "test_b.py::T::U::m[a::b]", "test_b.py::T::V::n"]
+    assert lc.find_testcase_from_testpath(
+        "test_b.py::T::V::n").pytest_item == items[1]
+    # test paths returned by 'launchable subset'
+    assert lc.find_testcase_from_testpath(
+        "test_b.py::b]").pytest_item == items[0]
+    assert lc.find_testcase_from_testpath(
+        "test_b.py::n").pytest_item == items[1]
+    set_results(lc, "test_b.py::T::V::n")
+    assert lc.find_testcase_from_testpath(
+        "test_b.py::n").junit_element().get("classname") == "test_b.T.V"
+
+
+def test_python_files():
+    pytest_list = [PseudoPytest("tests/sub/test_a.py", "f", f), PseudoPytest("tests/b_test.py", "m", T().m),
+                   PseudoPytest("tests/conftest.py", "f", f), PseudoPytest("tests/check_c.py", "f", f)]
+    lc = init_launchable_test_context(pytest_list)
+    # the file is taken from the nodeid, not from the file name in the keywords
+    assert lc.to_testpath_list() == [
+        "tests/sub/test_a.py::f", "tests/b_test.py::T::m"]
+    lc = init_launchable_test_context(pytest_list, ["check_*.py"])
+    assert lc.to_testpath_list() == ["tests/check_c.py::f"]
+    lc = init_launchable_test_context(pytest_list, ["tests/sub/*.py"])
+    assert lc.to_testpath_list() == ["tests/sub/test_a.py::f"]
+
+
+def test_granularity():
+    t = T()
+    pytest_list = [PseudoPytest("test_b.py", "m", t.m, "0"), PseudoPytest("test_a.py", "f", f, "0"),
+                   PseudoPytest("test_b.py", "m", t.m, "1"), PseudoPytest("test_a.py", "f", f, "1"),
+                   PseudoPytest("test_a.py", "g", f)]
+    lc = init_launchable_test_context(pytest_list)
+    lc.granularity = "class"
+    assert lc.to_unit_list() == ["test_b.py::T", "test_a.py::f", "test_a.py::g"]
+    lc.granularity = "file"
+    assert lc.to_unit_list() == ["test_b.py", "test_a.py"]
+
+    lc.set_subset_command_response("test_a.py\n", raw_rest=["test_b.py"])
+    assert lc.is_valid_subset_response()
+    lc.expand_subset_units()
+    assert lc.subset_list == ["test_a.py::f[0]",
+                              "test_a.py::f[1]", "test_a.py::g"]
+    assert lc.rest_list == ["test_b.py::T::m[0]", "test_b.py::T::m[1]"]
+    assert lc.subset_category("test_a.py::g") == "subset"
+
+    # xdist controller does not expand the units
+    lc.set_subset_command_response("test_a.py\n", raw_rest=["test_b.py"])
+    assert lc.subset_category("test_b.py::T::m[1]") == "rest"
+    # the inner classes are dropped by the pytest runner of launchable
+    lc.granularity = "case"
+    lc.set_subset_command_response("test_b.py::m\n", raw_rest=["test_a.py::g"])
+    assert lc.subset_key("test_b.py::T::U::m") == "test_b.py::m"
+    assert lc.subset_category("test_b.py::T::U::m") == "subset"
+    assert lc.subset_category("test_c.py::h") == "unknown"
+    lc.granularity = "class"
+    lc.set_subset_command_response("test_c.py\n")
+    assert not lc.is_valid_subset_response()
+
+    durations, fail_rates = unit_history({"test_b.py::T::m[0]": 1.0, "test_b.py::T::m[1]": 2.0, "test_a.py::g": 0.5},
+                                         {"test_b.py::T::m[0]": 0.5, "test_b.py::T::m[1]": 0.25}, "class")
+    assert durations == {"test_b.py::T": 3.0, "test_a.py::g": 0.5}
+    assert fail_rates == {"test_b.py::T": 0.5}
+
+
+def test_checkpoint(tmp_path):
+    directory = str(tmp_path / "checkpoints")
+    checkpoints = Checkpoints(directory, "build1")
+
+    pytest_list = [PseudoPytest("test_a.py", "f", f, str(i))
+                   for i in range(3)]
+    lc = init_launchable_test_context(pytest_list)
+    lc.checkpoints = checkpoints
+    for item in pytest_list:
+        set_results(lc, item.nodeid)
+    expected = etree.tostring(lc.junit_xml(), method="c14n")
+    cases = [lc.find_testcase_from_testpath(item.nodeid)
+             for item in pytest_list]
+    lc.write_checkpoint(cases[:2])
+    lc.write_checkpoint(cases[2:])
+    # the results are dropped
+    assert all(testcase.result is None for testcase in cases)
+    assert [os.path.basename(path) for path in shard_files(checkpoints.run_dir)] == [
+        "shard-00001.xml", "shard-00002.xml"]
+
+    # merged to the same document
+    path = str(tmp_path / "test-results.xml")
+    write_junit_elements(path, checkpoints.iter_elements(),
+                         lc.junit_testsuite_attributes())
+    assert etree.tostring(etree.parse(path), method="c14n") == expected
+    lc.checkpoints = None
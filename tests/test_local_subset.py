@@ -0,0 +1,39 @@
+import pytest
+from launchable_cli_args import CLIArgs
+from pytest_launchable.local_subset import local_subset, parse_percentage, parse_time
+
+
+def test_parse_time():
+    assert parse_time(300) == 300.0
+    assert parse_time("300") == 300.0
+    assert parse_time("30m") == 1800.0
+    assert parse_time("2h30m") == 9000.0
+    assert parse_time("1w3d") == 864000.0
+    with pytest.raises(ValueError):
+        parse_time("30x")
+
+
+def test_parse_percentage():
+    assert parse_percentage("30%") == 0.3
+    assert parse_percentage(50) == 0.5
+    assert parse_percentage("120%") == 1.0
+
+
+def test_local_subset():
+    args = CLIArgs.auto_configure("tests")
+    args.subset.confidence = None
+    testpath_list = ["a", "b", "c", "d", "new"]
+    durations = {"a": 4.0, "b": 1.0, "c": 2.0, "d": 3.0}
+    fail_rates = {"d": 0.5}
+
+    # failed test first, then the test without history (median 2.5s), then the shorter tests
+    args.subset.time = "6s"
+    assert local_subset(testpath_list, args.subset, durations, fail_rates) == (
+        ["d", "new"], ["a", "b", "c"])
+
+    # 70% of 12.5 seconds in total. "new" does not fit, "b" after it still does
+    args.subset.time = None
+    args.subset.target = "70%"
+    fail_rates["a"] = 0.2
+    assert local_subset(testpath_list, args.subset, durations, fail_rates) == (
+        ["d", "a", "b"], ["c", "new"])
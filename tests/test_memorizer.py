@@ -1,4 +1,11 @@
-from pytest_launchable.memorizer import memorizer
+import gc
+import importlib
+import weakref
+
+from launchable_cli_args.memorizer import PERSIST_DIR_ENV, memorizer, memorizer_stats
+
+# launchable_cli_args.memorizer is the function exported by launchable_cli_args
+memorizer_module = importlib.import_module("launchable_cli_args.memorizer")
 
 
 class Test_Memorizer:
@@ -14,3 +21,81 @@ class Test_Memorizer:
         assert a == 100
         assert b == 100
         assert self.call_count == 1, "must evaluate only once"
+
+    def test_instance_dropped(self):
+        other = Test_Memorizer()
+        other.call_count = 0
+        assert other.body() == 100
+        assert other.call_count == 1, "cached for each instance"
+        ref = weakref.ref(other)
+        del other
+        gc.collect()
+        assert ref() is None, "the cache must not keep the instance alive"
+
+
+class Slotted:
+    __slots__ = ("calls",)
+
+    def __init__(self):
+        self.calls = 0
+
+    @memorizer
+    def value(self, x):
+        self.calls += 1
+        return x * 2
+
+
+def test_slots():
+    slotted = Slotted()
+    assert slotted.value(1) == 2
+    assert slotted.value(1) == 2
+    assert slotted.calls == 1
+
+
+def test_arguments():
+    calls = []
+
+    @memorizer(maxsize=2)
+    def square(x, scale=1):
+        calls.append(x)
+        return x * x * scale
+
+    assert square(2) == 4
+    assert square(3) == 9
+    assert square(2) == 4
+    assert square(2, scale=2) == 8  # evicts 3, the least recently used
+    assert square(3) == 9
+    assert calls == [2, 3, 2, 3]
+    assert (square.hits, square.misses) == (1, 4)
+    assert ("%s.%s" % (__name__, "test_arguments.<locals>.square"), 1, 4, 2) in memorizer_stats()
+
+
+def test_persist(tmp_path, monkeypatch):
+    calls = []
+
+    def double(x):
+        calls.append(x)
+        return x * 2
+
+    # not persisted without the environment variable nor the default directory
+    monkeypatch.delenv(PERSIST_DIR_ENV, raising=False)
+    monkeypatch.setattr(memorizer_module, "default_persist_dir", None)
+    memorized = memorizer(double, persist=True)
+    assert memorized(1) == 2
+    monkeypatch.setenv(PERSIST_DIR_ENV, str(tmp_path))
+    memorized.cache_clear()
+    assert memorized(1) == 2
+    assert calls == [1, 1]
+
+    # another process reads the persisted result
+    memorized = memorizer(double, persist=True)
+    assert memorized(1) == 2
+    assert memorized(2) == 4
+    assert calls == [1, 1, 2]
+
+    # the default directory is used without the environment variable
+    monkeypatch.delenv(PERSIST_DIR_ENV)
+    memorizer_module.set_default_persist_dir(str(tmp_path))
+    memorized = memorizer(double, persist=True)
+    assert memorized(2) == 4
+    assert calls == [1, 1, 2]
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+from argparse import Namespace
+from typing import Dict
+
+import pytest
+from pytest_launchable import plugin
+from pytest_launchable.launchable_command import BACKENDS
+
+
+class PseudoConfig:
+    def __init__(self, **options):
+        self.option = Namespace(**options)
+
+
+def test_is_enabled() -> None:
+    assert plugin.CLI_BACKENDS == BACKENDS
+    assert not plugin.is_enabled(PseudoConfig(launchable=False))
+    assert plugin.is_enabled(PseudoConfig(launchable=True, collectonly=False))
+    # --collect-only does not record build, session, nor tests
+    assert not plugin.is_enabled(
+        PseudoConfig(launchable=True, collectonly=True))
+
+
+# logs the arguments of each call, and the candidates of subset, which are all in the subset
+FAKE_LAUNCHABLE = """#!%s
+import sys
+with open(%r, "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+    if sys.argv[1] == "subset":
+        candidates = sys.stdin.read()
+        f.write(candidates)
+        sys.stdout.write(candidates)
+"""
+
+CONFIG = """schema-version: 1.0
+build-name: build1
+record-build:
+  source: .
+record-session:
+subset:
+  mode: %s
+  target: 30%%
+record-tests:
+  result_dir: launchable-test-result
+"""
+
+
+# run pytest in the project with the fake launchable command
+def make_project(tmp_path, mode: str, files: Dict[str, str]):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "launchable"
+    fake.write_text(FAKE_LAUNCHABLE % (sys.executable, str(tmp_path / "calls.log")))
+    fake.chmod(0o755)
+    project = tmp_path / "project"
+    (project / ".launchable.d").mkdir(parents=True)
+    (project / ".launchable.d" / "config.yml").write_text(CONFIG % mode)
+    for name, body in files.items():
+        (project / name).write_text(body)
+    env = dict(os.environ, PATH=str(bin_dir) + os.pathsep + os.environ["PATH"], LAUNCHABLE_TOKEN="dummy")
+
+    def run(*args: str) -> None:
+        subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "--launchable",
+                        "--launchable-cli-backend", "process"] + list(args),
+                       cwd=str(project), env=env, check=True, stdout=subprocess.PIPE)
+    return project, run
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the fake launchable command is a script")
+def test_collect_only_makes_no_commands(tmp_path) -> None:
+    calls_log = tmp_path / "calls.log"
+    project, run = make_project(tmp_path, "record-only", {"test_a.py": "def test_a():\n    pass\n"})
+    run("--co")
+    assert not calls_log.exists()
+    assert not (project / "launchable-test-result").exists()
+    # the fake command is called without --co
+    run()
+    assert "record tests" in calls_log.read_text()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the fake launchable command is a script")
+def test_subset_after_conftest(tmp_path) -> None:
+    project, run = make_project(tmp_path, "subset", {
+        "test_a.py": "def test_a():\n    pass\n\n\ndef test_b():\n    pass\n",
+        # deselects test_b before the subset is requested
+        "conftest.py": "def pytest_collection_modifyitems(config, items):\n"
+                       "    deselected = [item for item in items if item.name == 'test_b']\n"
+                       "    items[:] = [item for item in items if item.name != 'test_b']\n"
+                       "    config.hook.pytest_deselected(items=deselected)\n",
+    })
+    run()
+    calls = (tmp_path / "calls.log").read_text()
+    assert "test_a.py::test_a" in calls
+    assert "test_b" not in calls
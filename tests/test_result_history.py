@@ -0,0 +1,35 @@
+from pytest_launchable.result_history import ResultHistory
+
+
+def test_record(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    history = ResultHistory(path, max_runs=3)
+    history.record([("test_a.py::f", "passed", 1.0),
+                   ("test_b.py::T::m", "failed", 2.0)])
+    history.record([("test_a.py::f", "failed", 3.0)])
+    history.close()
+
+    # reopen
+    history = ResultHistory(path, max_runs=3)
+    stats = history.stats()
+    assert stats["test_a.py::f"] == (2, 1.0, 3.0, 0.5, "f")
+    assert stats["test_b.py::T::m"] == (1, 2.0, 2.0, 1.0, "f")
+
+    # only the last 3 runs are kept
+    for duration in (5.0, 6.0, 7.0):
+        history.record([("test_a.py::f", "passed", duration)])
+    assert history.stats()["test_a.py::f"] == (3, 6.0, 7.0, 0.0, "p")
+    assert history.durations() == {"test_a.py::f": 6.0, "test_b.py::T::m": 2.0}
+    history.close()
+
+
+def test_percentile(tmp_path):
+    history = ResultHistory(str(tmp_path / "history.sqlite3"), max_runs=100)
+    for duration in range(100, 0, -1):
+        history.record([("test_a.py::f", "passed", float(duration))])
+    history.record([("test_b.py::T::m", "passed", 1.0)])
+    stats = history.stats()
+    assert stats["test_a.py::f"].p50 == 50.0
+    assert stats["test_a.py::f"].p95 == 95.0
+    assert stats["test_b.py::T::m"].p95 == 1.0
+    history.close()
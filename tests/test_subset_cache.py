@@ -0,0 +1,43 @@
+import os
+import time
+from launchable_cli_args import CLIArgs
+from pytest_launchable.subset_cache import SubsetCache, load_subset_file, save_subset_file
+
+
+def test_make_key() -> None:
+    args = CLIArgs.auto_configure("tests")
+    args.subset.mode = "subset"
+    key = SubsetCache.make_key("XXX", args.subset, ["test_a.py::f"])
+    assert key == SubsetCache.make_key("XXX", args.subset, ["test_a.py::f"])
+    assert key != SubsetCache.make_key("YYY", args.subset, ["test_a.py::f"])
+    assert key != SubsetCache.make_key("XXX", args.subset, ["test_a.py::g"])
+    args.subset.confidence = 90
+    assert key != SubsetCache.make_key("XXX", args.subset, ["test_a.py::f"])
+
+
+def test_get_and_put(tmp_path) -> None:
+    cache = SubsetCache(str(tmp_path), ttl=60, max_entries=2)
+    assert cache.get("a") is None
+    cache.put("a", "test_a.py::f\n", None)
+    cache.put("b", "test_a.py::f\n", ["test_b.py::T::m"])
+    assert cache.get("a") == ("test_a.py::f\n", None)
+    assert cache.get("b") == ("test_a.py::f\n", ["test_b.py::T::m"])
+
+    # the oldest entry is evicted by size
+    os.utime(cache.entry_path("a"), (time.time() - 10, time.time() - 10))
+    cache.put("c", "", None)
+    assert cache.get("a") is None
+    assert cache.get("c") == ("", None)
+
+    # expired entry
+    os.utime(cache.entry_path("b"), (time.time() - 61, time.time() - 61))
+    assert cache.get("b") is None
+    assert not os.path.exists(cache.entry_path("b"))
+
+
+def test_subset_file(tmp_path) -> None:
+    path = str(tmp_path / "artifacts" / "subset.json")
+    save_subset_file(path, (["test_a.py::f"], ["test_a.py::g"]), "local", {
+                     "test_a.py::f": 1.5})
+    assert load_subset_file(path) == (
+        (["test_a.py::f"], ["test_a.py::g"]), "local", {"test_a.py::f": 1.5})
@@ -0,0 +1,38 @@
+import json
+from pytest_launchable.timing import PhaseTimer, command_phase
+
+
+def test_phase_timer(tmp_path) -> None:
+    timer = PhaseTimer()
+    with timer.measure("config"):
+        pass
+    assert timer.results() == [], "disabled timer must not record"
+
+    timer.enabled = True
+    with timer.measure("config"):
+        pass
+    for i in range(3):
+        with timer.measure("test report"):
+            pass
+    timer.add("launchable verify", 1.5)
+    results = timer.results()
+    assert [(phase, calls) for phase, calls, _ in results] == [
+        ("config", 1), ("test report", 3), ("launchable verify", 1)]
+    assert results[2][2] == 1.5
+    lines = timer.summary_lines()
+    assert lines[1].startswith("config ")
+    assert lines[3].startswith("launchable verify ")
+
+    path = tmp_path / "timing.json"
+    timer.write_json(str(path))
+    phases = json.loads(path.read_text())["phases"]
+    assert phases[1] == {"phase": "test report",
+                         "calls": 3, "seconds": results[1][2]}
+
+
+def test_command_phase() -> None:
+    assert command_phase(("launchable", "record", "build",
+                         "--name", "X")) == "launchable record build"
+    assert command_phase(("launchable", "subset", "--target",
+                         "30%", "pytest")) == "launchable subset"
+    assert command_phase(("launchable", "verify")) == "launchable verify"
@@ -0,0 +1,52 @@
+from argparse import Namespace
+
+import pytest
+from pytest_launchable import xdist_support
+from pytest_launchable.xdist_support import SubsetCoordinator, exchange_subset
+
+
+def test_exchange_subset(tmp_path):
+    requests = []
+
+    def request_subset(testpath_list):
+        requests.append(testpath_list)
+        return "test_a.py::f\n", ["test_b.py::T::m"]
+
+    coordinator = SubsetCoordinator(str(tmp_path), request_subset)
+    assert exchange_subset(str(tmp_path), ["test_a.py::f", "test_b.py::T::m"]) == (
+        "test_a.py::f\n", ["test_b.py::T::m"])
+    # the second worker receives the same response
+    assert exchange_subset(str(tmp_path), ["test_a.py::f", "test_b.py::T::m"]) == (
+        "test_a.py::f\n", ["test_b.py::T::m"])
+    coordinator.stop()
+    assert requests == [["test_a.py::f", "test_b.py::T::m"]]
+
+
+def test_exchange_subset_error(tmp_path):
+    def request_subset(testpath_list):
+        raise Exception("subset failed")
+
+    coordinator = SubsetCoordinator(str(tmp_path), request_subset)
+    with pytest.raises(Exception, match="subset failed"):
+        exchange_subset(str(tmp_path), ["test_a.py::f"])
+    coordinator.stop()
+
+
+def test_stop_without_request(tmp_path):
+    coordinator = SubsetCoordinator(str(tmp_path), lambda line: ("", None))
+    coordinator.stop()
+    assert not coordinator.thread.is_alive()
+
+
+def test_exchange_subset_timeout(tmp_path, monkeypatch):
+    # no controller
+    monkeypatch.setattr(xdist_support, "SUBSET_WAIT_MARGIN", 0)
+    with pytest.raises(pytest.UsageError, match="not received"):
+        exchange_subset(str(tmp_path), ["test_a.py::f"], 0.1)
+
+
+def test_has_remote_workers():
+    assert not xdist_support.has_remote_workers(Namespace(option=Namespace(tx=["popen", "2*popen//python=python3"])))
+    assert xdist_support.has_remote_workers(Namespace(option=Namespace(tx=["popen", "ssh=host//chdir=work"])))
+    assert xdist_support.has_remote_workers(Namespace(option=Namespace(tx=["socket=192.168.1.2:8888"])))
+    assert not xdist_support.has_remote_workers(Namespace(option=Namespace()))
@@ -41,3 +41,15 @@ class YamlLoaderWithLineNumber(SafeLoader):
     @classmethod
     def from_string(cls, body: str) -> Any:
         return yaml.load(io.StringIO(body), Loader=YamlLoaderWithLineNumber)
+
+
+# the libyaml loader, if pyyaml is built with it
+FastSafeLoader = getattr(yaml, "CSafeLoader", SafeLoader)
+
+
+# same as YamlLoaderWithLineNumber.from_file() without "__line__"
+def load_file_fast(path: str) -> Any:
+    with open(path) as file:
+        o = yaml.load(file, Loader=FastSafeLoader)
+        o['__fullpath__'] = os.path.abspath(path)
+        return o